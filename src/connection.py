@@ -1,41 +1,182 @@
+import binascii
+import json
 import network
-import time
+import utime
+
+import phase_trace
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    # Only connect_async() needs it
+    asyncio = None
+
+
+def _run(steps):
+    """ Runs a generator of waits in ms, sleeping between them. @return its return value """
+    try:
+        while True:
+            utime.sleep_ms(next(steps))
+    except StopIteration as e:
+        return e.value
+
+
+async def _run_async(steps):
+    """ _run() for uasyncio, the other tasks run during the waits """
+    try:
+        while True:
+            await asyncio.sleep_ms(next(steps))
+    except StopIteration as e:
+        return e.value
 
 
 class Connection:
-    def __init__(self, credentials):
+    # Time between two checks of the link status
+    POLL_MS = 50
+    TIMEOUT_MS = 10_000
+    # The cached network answers quickly if it's there at all
+    FAST_TIMEOUT_MS = 5_000
+
+    def __init__(self, credentials, cache_file="wifi_cache.json", static_ip=False):
+        """
+        @param cache_file: where the last network that worked is saved, to try it first after a reset
+        @param static_ip: reuse the last DHCP lease as static address, skipping DHCP on the fast path
+        """
         self._credentials = credentials
         self._wlan = None
+        self._cache_file = cache_file
+        self._static_ip = static_ip
+        self._cache = self._load_cache()
+        # (ssid, fast path, ms, connected) of every attempt of the last connect()
+        self.attempts = []
 
     def connect(self) -> bool:
         """" @return: True if the WiFi is connected and there's an IP """
+        return _run(self.connect_steps())
+
+    async def connect_async(self) -> bool:
+        """ connect() that lets the other uasyncio tasks run while the link comes up """
+        return await _run_async(self.connect_steps())
+
+    def connect_steps(self):
+        """
+        The steps of connect(), as a generator that yields how many ms to
+        wait before checking the link again. @return the result of connect()
+        """
+        self.attempts = []
         self._wlan = network.WLAN(network.STA_IF)
         self._wlan.active(True)
+
+        if self._cache is not None and (yield from self._fast_connect()):
+            return True
+
+        visible = self._scan()
+        # Skip the networks out of range, unless none is in range: they might be hidden
+        in_range = [ssid for ssid, _ in self._credentials if ssid in visible]
         for ssid, password in self._credentials:
+            if in_range and ssid not in in_range:
+                print(f"Connection: {ssid} not in range")
+                continue
             print(f"Connection: trying {ssid}...")
-            self._wlan.connect(ssid, password)
-            if self._wait_connection():
+            if (yield from self._try(ssid, password, False, self.TIMEOUT_MS)):
                 print(f"Connection: connected to {ssid}")
+                bssid, channel = visible.get(ssid, (None, None))
+                self._save_cache(ssid, bssid, channel)
                 return True
             else:
                 print(f"Connection: failed to connect to {ssid}")
 
         return False
 
-    def _wait_connection(self, max_wait: int = 10) -> bool:
+    def _fast_connect(self):
+        """ Joins the cached access point directly, without scanning """
+        ssid = self._cache["ssid"]
+        password = None
+        for known_ssid, known_password in self._credentials:
+            if known_ssid == ssid:
+                password = known_password
+        if password is None:
+            # Not in the credentials anymore
+            return False
+
+        kwargs = {}
+        if self._cache.get("bssid"):
+            kwargs["bssid"] = binascii.unhexlify(self._cache["bssid"])
+        if self._cache.get("channel"):
+            kwargs["channel"] = self._cache["channel"]
+        use_static_ip = self._static_ip and self._cache.get("ifconfig")
+        if use_static_ip:
+            self._wlan.ifconfig(tuple(self._cache["ifconfig"]))
+
+        print(f"Connection: trying cached {ssid}...")
+        if (yield from self._try(ssid, password, True, self.FAST_TIMEOUT_MS, **kwargs)):
+            print(f"Connection: connected to {ssid}")
+            if list(self._wlan.ifconfig()) != self._cache.get("ifconfig"):
+                # New DHCP lease
+                self._save_cache(ssid, self._cache.get("bssid"), self._cache.get("channel"))
+            return True
+
+        print(f"Connection: cached {ssid} failed, scanning")
+        self._wlan.disconnect()
+        if use_static_ip:
+            self._wlan.ifconfig("dhcp")
+        return False
+
+    def _try(self, ssid, password, fast, timeout_ms, **kwargs):
+        phase_trace.mark("wifi_fast" if fast else "wifi_join")
+        start = utime.ticks_ms()
+        self._wlan.connect(ssid, password, **kwargs)
+        connected = yield from self._wait_connection(timeout_ms)
+        phase_trace.mark("wifi_up" if connected else "wifi_fail")
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+        self.attempts.append((ssid, fast, elapsed, connected))
+        print(f"Connection: {'fast ' if fast else ''}attempt on {ssid} took {elapsed} ms")
+        return connected
+
+    def _scan(self):
+        """ @return {ssid: (bssid, channel)} of the strongest access point of every visible network """
+        phase_trace.mark("wifi_scan")
+        visible = {}
+        try:
+            for ssid, bssid, channel, rssi, security, hidden in sorted(self._wlan.scan(), key=lambda ap: ap[3]):
+                # Sorted by ascending RSSI, the strongest one is written last
+                visible[ssid.decode()] = (binascii.hexlify(bssid).decode(), channel)
+        except (OSError, UnicodeError) as e:
+            print(f"Connection: scan failed: {e}")
+        return visible
+
+    def _wait_connection(self, timeout_ms: int):
         """
-        It blocks until the WiFi link is established or there is a failure.
+        Waits until the WiFi link is established or there is a failure.
         @return True if the WiFi is connected and there is an IP
         """
-        while (max_wait > 0):
+        start = utime.ticks_ms()
+        while utime.ticks_diff(utime.ticks_ms(), start) < timeout_ms:
             if self._wlan.status() < 0 or self._wlan.status() >= 3:
                 break
-            max_wait -= 1
-            time.sleep(1)
+            yield self.POLL_MS
 
         return self._wlan.status() == 3
 
+    def _load_cache(self):
+        try:
+            with open(self._cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cache(self, ssid, bssid, channel):
+        self._cache = {"ssid": ssid, "bssid": bssid, "channel": channel,
+                       "ifconfig": list(self._wlan.ifconfig())}
+        try:
+            with open(self._cache_file, "w") as f:
+                json.dump(self._cache, f)
+        except OSError as e:
+            print(f"Connection: cannot save {self._cache_file}: {e}")
+
     def disconnect(self) -> None:
+        if self._wlan is None:
+            return
         self._wlan.disconnect()
         self._wlan.active(False)
         self._wlan.deinit()
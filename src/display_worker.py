@@ -0,0 +1,190 @@
+"""
+Drives the e-paper panel from the second core of the RP2040, so that the
+SPI transfer and the refresh don't hold the core that renders and talks to
+the network.
+"""
+import _thread
+import framebuf
+import utime
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    # Only ReadBusyAsync() needs it
+    asyncio = None
+
+import epaper2in13b
+
+# Interval of the checks of the worker state, on both cores
+POLL_MS = 10
+
+
+class DisplayWorker:
+    """
+    Wraps the landscape driver with the same methods used by main.py.
+    Core 0 draws in imageblack and imagered, display() copies them in the
+    buffers of the driver, a single slot that core 1 sends when the panel
+    is idle. A frame that core 1 didn't take yet is replaced by the newer one.
+    The drawing buffers keep the frame, so it can be drawn over.
+
+    start() runs the worker on core 1 and stop() waits for the last refresh
+    and ends it: lightsleep() needs core 1 stopped. While the worker isn't
+    running the driver is used directly.
+    """
+    def __init__(self, epd):
+        self.epd = epd
+        self._black = bytearray(len(epd.buffer_balck))
+        self._red = bytearray(len(epd.buffer_red))
+        self._black[:] = epd.buffer_balck
+        self._red[:] = epd.buffer_red
+        self.imageblack = framebuf.FrameBuffer(self._black, epd.height, epd.width, framebuf.MONO_VLSB)
+        self.imagered = framebuf.FrameBuffer(self._red, epd.height, epd.width, framebuf.MONO_VLSB)
+        # As in the driver, display() returns at the end of the refresh,
+        # and the driver calls phase_hook while the worker isn't running
+        self.wait_refresh = True
+        self.phase_hook = epd.phase_hook
+
+        self._lock = _thread.allocate_lock()
+        self._pending = False
+        self._sending = False
+        # Result of the driver for the last frame sent by core 1
+        self._refreshed = True
+        self._running = False
+        self._stop = False
+        self._busy_wait = epd.busy_wait
+
+    def start(self):
+        if self._running:
+            return
+        epd = self.epd
+        self._busy_wait = epd.busy_wait
+        # lightsleep() and the BUSY interrupt belong to core 0, the phases
+        # are reported from core 0 by display()
+        epd.busy_wait = epaper2in13b.BUSY_WAIT_POLL
+        epd.wait_refresh = False
+        epd.phase_hook = None
+        self._pending = False
+        self._stop = False
+        self._running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        """ Waits until the frame handed over is on the panel, then ends the worker """
+        if not self._running:
+            return
+        self._stop = True
+        while self._running:
+            utime.sleep_ms(POLL_MS)
+        self._driver_settings()
+
+    def _driver_settings(self):
+        """ Sets up the driver to be used from core 0 """
+        self.epd.busy_wait = self._busy_wait
+        self.epd.wait_refresh = self.wait_refresh
+        self.epd.phase_hook = self.phase_hook
+
+    def _run(self):
+        epd = self.epd
+        try:
+            while True:
+                with self._lock:
+                    take = self._pending
+                    self._pending = False
+                    self._sending = take
+                if take:
+                    try:
+                        refreshing = epd.display()
+                        self._refreshed = refreshing
+                    finally:
+                        # Core 0 waits on it, also when the transfer fails
+                        with self._lock:
+                            self._sending = False
+                    if refreshing:
+                        # Core 0 can hand over the next frame meanwhile
+                        epd.ReadBusy()
+                elif self._stop:
+                    break
+                else:
+                    utime.sleep_ms(POLL_MS)
+        finally:
+            self._running = False
+
+    def display(self):
+        """
+        Hands the frame over to core 1
+        @return False if the driver skipped an unchanged frame. Without
+        wait_refresh the result isn't known yet, True once handed over.
+        """
+        if self.phase_hook is not None and self._running:
+            self.phase_hook("spi")
+        while self._running:
+            with self._lock:
+                if not self._sending:
+                    self.epd.buffer_balck[:] = self._black
+                    self.epd.buffer_red[:] = self._red
+                    self._pending = True
+                    break
+            utime.sleep_ms(1)
+        else:
+            # Not started, or core 1 ended on an error
+            self.epd.buffer_balck[:] = self._black
+            self.epd.buffer_red[:] = self._red
+            self._driver_settings()
+            return self.epd.display()
+
+        if self.phase_hook is not None:
+            self.phase_hook("busy")
+        if not self.wait_refresh:
+            return True
+        self.wait()
+        return self._refreshed
+
+    def between_frames(self, function):
+        """
+        Calls function on core 0 when core 1 isn't sending a frame, core 1
+        doesn't take the next one until it returns. Core 1 doesn't allocate
+        while it waits for a refresh. @return the result of function
+        """
+        while True:
+            with self._lock:
+                if not (self._running and self._sending):
+                    return function()
+            utime.sleep_ms(1)
+
+    def busy(self):
+        """ @return True until the last frame handed over is on the panel """
+        with self._lock:
+            # Core 1 may have ended on an error with a frame still pending
+            if self._running and (self._pending or self._sending):
+                return True
+        return self.epd.busy()
+
+    def wait(self):
+        while self.busy():
+            utime.sleep_ms(POLL_MS)
+
+    async def ReadBusyAsync(self):
+        while self.busy():
+            await asyncio.sleep_ms(POLL_MS)
+        return True
+
+    def Clear(self, colorblack, colorred):
+        # Sent by core 0, the fill doesn't go through the drawing buffers
+        running = self._running
+        self.stop()
+        self._driver_settings()
+        self.epd.Clear(colorblack, colorred)
+        if running:
+            self.start()
+
+    def init(self):
+        """ Initializes the panel after the deep sleep and starts the worker """
+        self.stop()
+        self._driver_settings()
+        self.epd.init()
+        self.start()
+
+    def sleep(self):
+        self.stop()
+        self._driver_settings()
+        self.epd.sleep()
@@ -0,0 +1,137 @@
+import machine
+import utime
+
+import ina219
+
+
+PHASES = ("wake", "wifi", "fetch", "render", "spi", "busy", "sleep")
+
+
+class EnergyProfiler:
+    """
+    Integrates the current measured by the INA219 over the phases of a cycle
+    and tracks the lowest bus voltage, the sag caused by the WiFi transmissions.
+    The current is sampled at every phase change and every sample_ms by a
+    timer. The timer also wakes the core up during the lightsleep of the BUSY
+    wait, so the profile slightly overestimates that phase.
+    The INA219 converts continuously while the board is awake and is powered
+    down for the sleep phase: it can't be read in lightsleep anyway, and the
+    sleep phase is accounted at sleep_current_ma.
+    sent_bytes, if given, returns the bytes sent to the panel so far, the
+    report shows how many every cycle sent.
+    A cycle starts with the "wake" phase, the last `history` cycles are kept.
+    """
+    def __init__(self, ups, sample_ms=200, history=48, sleep_current_ma=2.0, capacity_mah=1000, sent_bytes=None):
+        self._ups = ups
+        self.sample_ms = sample_ms
+        self.history = history
+        self.sleep_current_ma = sleep_current_ma
+        self.capacity_mah = capacity_mah
+        self.sent_bytes = sent_bytes
+        self._timer = None
+        self._phase = None
+        self._last_ticks = 0
+        self._last_ma = 0
+        # mA * ms and ms of every phase in the current cycle
+        self._charge = [0.0] * len(PHASES)
+        self._duration = [0] * len(PHASES)
+        self._min_v = None
+        # sent_bytes() at the start of the cycle
+        self._sent_at_wake = None
+        # (mAh of every phase, cycle duration in ms, lowest bus voltage, bytes sent to the panel) of the last cycles
+        self._cycles = []
+
+    def _read_ma(self):
+        if PHASES[self._phase] == "sleep":
+            return self.sleep_current_ma
+        try:
+            # Negative while the battery is discharging
+            v, _, ma = self._ups.measure()
+            ma = abs(ma)
+        except OSError:
+            return self._last_ma
+        if self._min_v is None or v < self._min_v:
+            self._min_v = v
+        return ma
+
+    def sample(self, timer=None):
+        if self._phase is None:
+            return
+        now = utime.ticks_ms()
+        ma = self._read_ma()
+        dt = utime.ticks_diff(now, self._last_ticks)
+        self._charge[self._phase] += (self._last_ma + ma) / 2 * dt
+        self._duration[self._phase] += dt
+        self._last_ticks = now
+        self._last_ma = ma
+
+    def phase(self, name):
+        """ Closes the current phase and starts the given one """
+        self.sample()
+        if name == "wake" and self._phase is not None:
+            self._end_cycle()
+        if name == "wake" and self.sent_bytes is not None:
+            self._sent_at_wake = self.sent_bytes()
+
+        self._phase = PHASES.index(name)
+        if name == "sleep":
+            if self._timer is not None:
+                self._timer.deinit()
+                self._timer = None
+            self._ups.power_down()
+        elif self._timer is None:
+            self._ups.set_mode(ina219.Mode.SANDBVOLT_CONTINUOUS)
+            self._timer = machine.Timer(mode=machine.Timer.PERIODIC, period=self.sample_ms, callback=self.sample)
+        self._last_ticks = utime.ticks_ms()
+        self._last_ma = self._read_ma()
+
+    def _end_cycle(self):
+        mah = [charge / 3_600_000 for charge in self._charge]
+        sent = None
+        if self._sent_at_wake is not None:
+            sent = self.sent_bytes() - self._sent_at_wake
+        self._cycles.append((mah, sum(self._duration), self._min_v, sent))
+        if len(self._cycles) > self.history:
+            self._cycles.pop(0)
+        self._charge = [0.0] * len(PHASES)
+        self._duration = [0] * len(PHASES)
+        self._min_v = None
+
+    def average_cycle(self):
+        """ @return (mAh of every phase, cycle ms) averaged over the kept cycles, or None """
+        if not self._cycles:
+            return None
+        mah = [0.0] * len(PHASES)
+        ms = 0
+        for cycle_mah, cycle_ms, _, _ in self._cycles:
+            for i in range(len(PHASES)):
+                mah[i] += cycle_mah[i] / len(self._cycles)
+            ms += cycle_ms / len(self._cycles)
+        return mah, ms
+
+    def remaining_hours(self, charge_percent):
+        """ @return the battery life left at the average consumption, or None without data """
+        average = self.average_cycle()
+        if average is None or sum(average[0]) <= 0:
+            return None
+        mah_per_hour = sum(average[0]) * 3_600_000 / average[1]
+        return self.capacity_mah * charge_percent / 100 / mah_per_hour
+
+    def report(self, charge_percent=None):
+        if not self._cycles:
+            return "Energy: no complete cycle yet"
+        last_mah, last_ms, min_v, sent = self._cycles[-1]
+        mah, ms = self.average_cycle()
+        lines = [f"Energy: last cycle {sum(last_mah):.3f} mAh in {last_ms // 1000} s, " +
+                 f"average {sum(mah):.3f} mAh over {len(self._cycles)} cycles"]
+        if min_v is not None:
+            lines.append(f"  lowest bus voltage {min_v:.3f} V")
+        for i in range(len(PHASES)):
+            lines.append(f"  {PHASES[i]:<6} {last_mah[i]:8.4f} mAh (avg {mah[i]:8.4f})")
+        if sent is not None:
+            lines.append(f"  {sent} bytes sent to the panel")
+        if charge_percent is not None:
+            hours = self.remaining_hours(charge_percent)
+            if hours is not None:
+                lines.append(f"  battery life left {hours:.0f} h ({hours / 24:.1f} days)")
+        return "\n".join(lines)
@@ -27,10 +27,19 @@
 # THE SOFTWARE.
 #
 
-from machine import Pin, SPI
+from machine import Pin, SPI, idle, lightsleep
 import framebuf
+import hashlib
 import utime
 
+import phase_trace
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    # Only ReadBusyAsync() needs it
+    asyncio = None
+
 
 EPD_WIDTH = 122
 EPD_HEIGHT = 250
@@ -40,8 +49,25 @@ DC_PIN = 8
 CS_PIN = 9
 BUSY_PIN = 13
 
+# Size of the buffer used to stream a fill pattern to the panel RAM
+FILL_CHUNK_SIZE = 64
+
+# How ReadBusy() waits for the panel
+BUSY_WAIT_POLL = 0  # check the pin every 10 ms
+BUSY_WAIT_IDLE = 1  # stop the core until the next interrupt
+BUSY_WAIT_LIGHTSLEEP = 2  # lightsleep, woken up by the BUSY falling edge
+BUSY_TIMEOUT_MS = 30_000
+# Longest lightsleep between two checks of the BUSY pin
+BUSY_SLEEP_SLICE_MS = 1000
+# Interval of the checks of the BUSY pin in ReadBusyAsync()
+BUSY_POLL_MS = 50
+
+
+class EPD_2in13_B_V4_Landscape:
+    # Approximate number of SPI bytes needed to open a RAM window,
+    # used to decide when two dirty rows are better sent together
+    WINDOW_COST = 16
 
-class EPD_2in13_B_V4_Portrait:
     def __init__(self):
         self.reset_pin = Pin(RST_PIN, Pin.OUT)
 
@@ -57,16 +83,51 @@ class EPD_2in13_B_V4_Portrait:
         self.spi.init(baudrate=4000_000)
         self.dc_pin = Pin(DC_PIN, Pin.OUT)
 
+        # Scratch buffers reused by every transfer, so that sending
+        # commands and filling the RAM doesn't allocate on the heap
+        self._byte = bytearray(1)
+        self._chunk = bytearray(FILL_CHUNK_SIZE)
+
+        self.busy_wait = BUSY_WAIT_LIGHTSLEEP
+        self.busy_timeout_ms = BUSY_TIMEOUT_MS
+        # When False, display() and Clear() return as soon as the refresh
+        # starts, and the next command to the panel waits for its end
+        self.wait_refresh = True
+        # Duration of the last ReadBusy() call
+        self.last_busy_ms = 0
+        # Bytes of the frames sent by display() since the start, for the energy profiling
+        self.sent_bytes = 0
+        self._busy_flag = False
+        # Called with "spi" when a frame starts to be sent and with "busy"
+        # when the panel starts refreshing, for the energy profiling
+        self.phase_hook = None
+
         self.buffer_balck = bytearray(self.height * self.width // 8)
         self.buffer_red = bytearray(self.height * self.width // 8)
         self.imageblack = framebuf.FrameBuffer(self.buffer_balck,
-                                               self.width,
                                                self.height,
-                                               framebuf.MONO_HLSB)
+                                               self.width,
+                                               framebuf.MONO_VLSB)
         self.imagered = framebuf.FrameBuffer(self.buffer_red,
-                                             self.width,
                                              self.height,
-                                             framebuf.MONO_HLSB)
+                                             self.width,
+                                             framebuf.MONO_VLSB)
+
+        # Copy of the last frame sent to the panel RAM, used to send only
+        # the regions that changed. Set partial_update to False to always
+        # send the whole frame.
+        self.partial_update = True
+        self._shadow_black = bytearray(len(self.buffer_balck))
+        self._shadow_red = bytearray(len(self.buffer_red))
+        self._shadow_valid = False
+
+        # Fingerprint of the frame on the panel. When skip_unchanged is set,
+        # display() doesn't refresh the panel if the new frame has the same
+        # fingerprint. Areas listed in fingerprint_ignore as (x, y, w, h)
+        # rectangles don't count in the comparison.
+        self.skip_unchanged = True
+        self.fingerprint_ignore = ()
+        self._fingerprint = None
         self.init()
 
     def digital_write(self, pin, value):
@@ -76,10 +137,12 @@ class EPD_2in13_B_V4_Portrait:
         return pin.value()
 
     def delay_ms(self, delaytime):
-        utime.sleep(delaytime / 1000.0)
+        utime.sleep_ms(delaytime)
 
     def spi_writebyte(self, data):
-        self.spi.write(bytearray(data))
+        for value in data:
+            self._byte[0] = value
+            self.spi.write(self._byte)
 
     def module_exit(self):
         self.digital_write(self.reset_pin, 0)
@@ -94,33 +157,117 @@ class EPD_2in13_B_V4_Portrait:
         self.delay_ms(50)
 
     def send_command(self, command):
+        self._byte[0] = command
         self.digital_write(self.dc_pin, 0)
         self.digital_write(self.cs_pin, 0)
-        self.spi_writebyte([command])
+        self.spi.write(self._byte)
         self.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
+        self._byte[0] = data
         self.digital_write(self.dc_pin, 1)
         self.digital_write(self.cs_pin, 0)
-        self.spi_writebyte([data])
+        self.spi.write(self._byte)
         self.digital_write(self.cs_pin, 1)
 
     def send_data1(self, buf):
         self.digital_write(self.dc_pin, 1)
         self.digital_write(self.cs_pin, 0)
-        self.spi.write(bytearray(buf))
+        self.spi.write(buf)
+        self.digital_write(self.cs_pin, 1)
+
+    def send_fill(self, value, count):
+        """ Sends count times the byte value, streaming it from the scratch chunk """
+        chunk = self._chunk
+        for i in range(len(chunk)):
+            chunk[i] = value
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        while count >= len(chunk):
+            self.spi.write(chunk)
+            count -= len(chunk)
+        if count > 0:
+            self.spi.write(memoryview(chunk)[:count])
         self.digital_write(self.cs_pin, 1)
 
+    def _busy_released(self, pin):
+        self._busy_flag = False
+
     def ReadBusy(self):
-        print('busy')
-        while (self.digital_read(self.busy_pin) == 1):
-            self.delay_ms(10)
-        print('busy release')
+        """
+        Waits until the panel releases the BUSY pin, for at most busy_timeout_ms.
+        The time spent waiting is stored in last_busy_ms.
+        @return False if the wait timed out
+        """
+        phase_trace.mark("epd_busy")
+        start = utime.ticks_ms()
+        released = True
+        self._busy_flag = True
+        if self.busy_wait != BUSY_WAIT_POLL:
+            self.busy_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._busy_released)
+        while self._busy_flag and self.digital_read(self.busy_pin) == 1:
+            remaining = self.busy_timeout_ms - utime.ticks_diff(utime.ticks_ms(), start)
+            if remaining <= 0:
+                released = False
+                break
+            if self.busy_wait == BUSY_WAIT_LIGHTSLEEP:
+                lightsleep(min(remaining, BUSY_SLEEP_SLICE_MS))
+            elif self.busy_wait == BUSY_WAIT_IDLE:
+                idle()
+            else:
+                self.delay_ms(10)
+        if self.busy_wait != BUSY_WAIT_POLL:
+            self.busy_pin.irq(handler=None)
+
+        self.last_busy_ms = utime.ticks_diff(utime.ticks_ms(), start)
+        phase_trace.mark("epd_ready", 1 if released else 0)
+        if not released:
+            print(f"EPD: BUSY still high after {self.last_busy_ms} ms")
         self.delay_ms(20)
+        return released
+
+    def busy(self):
+        return self.digital_read(self.busy_pin) == 1
+
+    def wait_idle(self):
+        """ Waits for the end of a refresh started with wait_refresh False """
+        if self.busy():
+            self.ReadBusy()
+
+    async def ReadBusyAsync(self):
+        """
+        ReadBusy() for uasyncio, the other tasks run while the panel is busy.
+        @return False if the wait timed out
+        """
+        if not self.busy():
+            return True
+        phase_trace.mark("epd_busy")
+        start = utime.ticks_ms()
+        released = True
+        while self.busy():
+            if utime.ticks_diff(utime.ticks_ms(), start) >= self.busy_timeout_ms:
+                released = False
+                break
+            await asyncio.sleep_ms(BUSY_POLL_MS)
+
+        self.last_busy_ms = utime.ticks_diff(utime.ticks_ms(), start)
+        phase_trace.mark("epd_ready", 1 if released else 0)
+        if not released:
+            print(f"EPD: BUSY still high after {self.last_busy_ms} ms")
+        await asyncio.sleep_ms(20)
+        return released
+
+    def _phase(self, name):
+        if name == "spi":
+            phase_trace.mark("epd_spi")
+        if self.phase_hook is not None:
+            self.phase_hook(name)
 
     def TurnOnDisplay(self):
         self.send_command(0x20)  # Activate Display Update Sequence
-        self.ReadBusy()
+        self._phase("busy")
+        if self.wait_refresh:
+            self.ReadBusy()
 
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
         self.send_command(0x44)  # SET_RAM_X_ADDRESS_START_END_POSITION
@@ -143,6 +290,8 @@ class EPD_2in13_B_V4_Portrait:
 
     def init(self):
         print('init')
+        # A reset would stop a refresh in progress
+        self.wait_idle()
         self.reset()
 
         self.ReadBusy()
@@ -155,7 +304,7 @@ class EPD_2in13_B_V4_Portrait:
         self.send_data(0x00)
 
         self.send_command(0x11)  # data entry mode
-        self.send_data(0x03)
+        self.send_data(0x07)
 
         self.SetWindows(0, 0, self.width - 1, self.height - 1)
         self.SetCursor(0, 0)
@@ -174,249 +323,152 @@ class EPD_2in13_B_V4_Portrait:
 
         return 0
 
-    def display(self):
-        self.send_command(0x24)
-        self.send_data1(self.buffer_balck)
-
-        self.send_command(0x26)
-        self.send_data1(self.buffer_red)
-
-        self.TurnOnDisplay()
-
-    def Clear(self, colorblack, colorred):
-        self.send_command(0x24)
-        self.send_data1([colorred] * self.height * int(self.width / 8))
-
-        self.send_command(0x26)
-        self.send_data1([colorred] * self.height * int(self.width / 8))
-
-        self.TurnOnDisplay()
-
-    def sleep(self):
-        self.send_command(0x10)
-        self.send_data(0x01)
-
-        self.delay_ms(2000)
-        self.module_exit()
-
-
-class EPD_2in13_B_V4_Landscape:
-    def __init__(self):
-        self.reset_pin = Pin(RST_PIN, Pin.OUT)
-
-        self.busy_pin = Pin(BUSY_PIN, Pin.IN, Pin.PULL_UP)
-        self.cs_pin = Pin(CS_PIN, Pin.OUT)
-        if EPD_WIDTH % 8 == 0:
-            self.width = EPD_WIDTH
-        else:
-            self.width = (EPD_WIDTH // 8) * 8 + 8
-        self.height = EPD_HEIGHT
-
-        self.spi = SPI(1)
-        self.spi.init(baudrate=4000_000)
-        self.dc_pin = Pin(DC_PIN, Pin.OUT)
-
-        self.buffer_balck = bytearray(self.height * self.width // 8)
-        self.buffer_red = bytearray(self.height * self.width // 8)
-        self.imageblack = framebuf.FrameBuffer(self.buffer_balck,
-                                               self.height,
-                                               self.width,
-                                               framebuf.MONO_VLSB)
-        self.imagered = framebuf.FrameBuffer(self.buffer_red,
-                                             self.height,
-                                             self.width,
-                                             framebuf.MONO_VLSB)
-        self.init()
-
-    def digital_write(self, pin, value):
-        pin.value(value)
-
-    def digital_read(self, pin):
-        return pin.value()
-
-    def delay_ms(self, delaytime):
-        utime.sleep(delaytime / 1000.0)
-
-    def spi_writebyte(self, data):
-        self.spi.write(bytearray(data))
-
-    def module_exit(self):
-        self.digital_write(self.reset_pin, 0)
-
-    # Hardware reset
-    def reset(self):
-        self.digital_write(self.reset_pin, 1)
-        self.delay_ms(50)
-        self.digital_write(self.reset_pin, 0)
-        self.delay_ms(2)
-        self.digital_write(self.reset_pin, 1)
-        self.delay_ms(50)
-
-    def send_command(self, command):
-        self.digital_write(self.dc_pin, 0)
-        self.digital_write(self.cs_pin, 0)
-        self.spi_writebyte([command])
-        self.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
+    def send_plane(self, buf):
+        # The MONO_VLSB buffer is made of width / 8 rows of height bytes each,
+        # the panel expects the same rows starting from the last one.
+        # Every row is sent as a slice of the buffer, so nothing is copied
+        # and CS stays asserted for the whole plane.
+        mv = memoryview(buf)
         self.digital_write(self.dc_pin, 1)
         self.digital_write(self.cs_pin, 0)
-        self.spi_writebyte([data])
+        for j in range(self.width // 8 - 1, -1, -1):
+            self.spi.write(mv[j * self.height:(j + 1) * self.height])
         self.digital_write(self.cs_pin, 1)
 
-    def send_data1(self, buf):
+    def dirty_windows(self, buf, shadow):
+        """
+        Groups the bytes of buf that differ from shadow in rectangles.
+        Adjacent rows are merged when sending the bounding box costs less
+        than opening another window.
+        @return a list of (first_row, last_row, first_col, last_col) in buffer coordinates
+        """
+        windows = []
+        h = self.height
+        for j in range(self.width // 8):
+            base = j * h
+            first = 0
+            while first < h and buf[base + first] == shadow[base + first]:
+                first += 1
+            if first == h:
+                continue
+            last = h - 1
+            while buf[base + last] == shadow[base + last]:
+                last -= 1
+
+            if windows:
+                j0, j1, f, l = windows[-1]
+                if j1 == j - 1:
+                    nf = min(f, first)
+                    nl = max(l, last)
+                    merged = (j - j0 + 1) * (nl - nf + 1)
+                    separate = (j1 - j0 + 1) * (l - f + 1) + (last - first + 1) + self.WINDOW_COST
+                    if merged <= separate:
+                        windows[-1] = (j0, j, nf, nl)
+                        continue
+            windows.append((j, j, first, last))
+        return windows
+
+    def send_window(self, command, buf, window):
+        j0, j1, first, last = window
+        # Buffer row j is the panel RAM column (rows - 1 - j)
+        rows = self.width // 8
+        self.SetWindows((rows - 1 - j1) * 8, first, (rows - 1 - j0) * 8, last)
+        self.SetCursor(rows - 1 - j1, first)
+        self.send_command(command)
+
+        mv = memoryview(buf)
+        h = self.height
         self.digital_write(self.dc_pin, 1)
         self.digital_write(self.cs_pin, 0)
-        self.spi.write(bytearray(buf))
+        for j in range(j1, j0 - 1, -1):
+            self.spi.write(mv[j * h + first:j * h + last + 1])
         self.digital_write(self.cs_pin, 1)
 
-    def ReadBusy(self):
-        print('busy')
-        while (self.digital_read(self.busy_pin) == 1):
-            self.delay_ms(10)
-        print('busy release')
-        self.delay_ms(20)
-
-    def TurnOnDisplay(self):
-        self.send_command(0x20)  # Activate Display Update Sequence
-        self.ReadBusy()
-
-    def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44)  # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart >> 3) & 0xFF)
-        self.send_data((Xend >> 3) & 0xFF)
-
-        self.send_command(0x45)  # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0xFF)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0xFF)
-
-    def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E)  # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0xFF)
-
-        self.send_command(0x4F)  # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0xFF)
-
-    def init(self):
-        print('init')
-        self.reset()
-
-        self.ReadBusy()
-        self.send_command(0x12)  # SWRESET
-        self.ReadBusy()
-
-        self.send_command(0x01)  # Driver output control
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x11)  # data entry mode
-        self.send_data(0x07)
+    def display_partial(self):
+        """ Sends only the regions that changed since the last frame. @return the number of bytes sent """
+        sent = 0
+        for command, buf, shadow in ((0x24, self.buffer_balck, self._shadow_black),
+                                     (0x26, self.buffer_red, self._shadow_red)):
+            for window in self.dirty_windows(buf, shadow):
+                self.send_window(command, buf, window)
+                sent += (window[1] - window[0] + 1) * (window[3] - window[2] + 1)
 
+        # Restore the full window for the next full transfer
         self.SetWindows(0, 0, self.width - 1, self.height - 1)
         self.SetCursor(0, 0)
+        return sent
+
+    def fingerprint(self):
+        """ @return a hash of both planes, without the areas in fingerprint_ignore """
+        # Column ranges to skip in each row of bytes
+        skip = [[] for _ in range(self.width // 8)]
+        for x, y, w, h in self.fingerprint_ignore:
+            for j in range(max(y, 0) // 8, min((y + h - 1) // 8, len(skip) - 1) + 1):
+                skip[j].append((max(x, 0), min(x + w, self.height)))
+
+        digest = hashlib.sha256()
+        for buf in (self.buffer_balck, self.buffer_red):
+            mv = memoryview(buf)
+            for j in range(len(skip)):
+                start = j * self.height
+                end = start + self.height
+                for first, last in sorted(skip[j]):
+                    if start < j * self.height + first:
+                        digest.update(mv[start:j * self.height + first])
+                    start = max(start, j * self.height + last)
+                if start < end:
+                    digest.update(mv[start:end])
+        return digest.digest()
 
-        self.send_command(0x3C)  # BorderWaveform
-        self.send_data(0x05)
-
-        self.send_command(0x18)  # Read built-in temperature sensor
-        self.send_data(0x80)
-
-        self.send_command(0x21)  # Display update control
-        self.send_data(0x80)
-        self.send_data(0x80)
-
-        self.ReadBusy()
+    def display(self):
+        """ @return False if the refresh was skipped because the frame didn't change """
+        if self.skip_unchanged:
+            fingerprint = self.fingerprint()
+            if fingerprint == self._fingerprint:
+                print("display: frame unchanged, skipping refresh")
+                return False
+            self._fingerprint = fingerprint
+        else:
+            self._fingerprint = None
 
-        return 0
+        self.wait_idle()
+        self._phase("spi")
+        if self.partial_update and self._shadow_valid:
+            self.sent_bytes += self.display_partial()
+        else:
+            self.send_command(0x24)
+            self.send_plane(self.buffer_balck)
 
-    def display(self):
-        self.send_command(0x24)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(self.buffer_balck[i + j * self.height])
+            self.send_command(0x26)
+            self.send_plane(self.buffer_red)
+            self.sent_bytes += len(self.buffer_balck) + len(self.buffer_red)
 
-        self.send_command(0x26)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(self.buffer_red[i + j * self.height])
+        self._shadow_black[:] = self.buffer_balck
+        self._shadow_red[:] = self.buffer_red
+        self._shadow_valid = True
 
         self.TurnOnDisplay()
+        return True
 
     def Clear(self, colorblack, colorred):
+        # The next display() has to send the whole frame
+        self._shadow_valid = False
+        self._fingerprint = None
+
+        self.wait_idle()
+        self._phase("spi")
         self.send_command(0x24)
-        self.send_data1([colorblack] * self.height * int(self.width / 8))
+        self.send_fill(colorblack, self.height * self.width // 8)
 
         self.send_command(0x26)
-        self.send_data1([colorred] * self.height * int(self.width / 8))
+        self.send_fill(colorred, self.height * self.width // 8)
 
         self.TurnOnDisplay()
 
     def sleep(self):
+        self.wait_idle()
         self.send_command(0x10)
         self.send_data(0x01)
 
         self.delay_ms(2000)
         self.module_exit()
-
-
-if __name__ == '__main__':
-    epd = EPD_2in13_B_V4_Portrait()
-    epd.Clear(0xff, 0xff)
-
-    epd.imageblack.fill(0xff)
-    epd.imagered.fill(0xff)
-    epd.imageblack.text("Waveshare", 0, 10, 0x00)
-    epd.imagered.text("ePaper-2.13B", 0, 25, 0x00)
-    epd.imageblack.text("RPi Pico", 0, 40, 0x00)
-    epd.imagered.text("Hello World", 0, 55, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd.imagered.vline(10, 90, 40, 0x00)
-    epd.imagered.vline(90, 90, 40, 0x00)
-    epd.imageblack.hline(10, 90, 80, 0x00)
-    epd.imageblack.hline(10, 130, 80, 0x00)
-    epd.imagered.line(10, 90, 90, 130, 0x00)
-    epd.imageblack.line(90, 90, 10, 130, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd.imageblack.rect(10, 150, 40, 40, 0x00)
-    epd.imagered.fill_rect(60, 150, 40, 40, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd = EPD_2in13_B_V4_Landscape()
-    epd.Clear(0xff, 0xff)
-
-    epd.imageblack.fill(0xff)
-    epd.imagered.fill(0xff)
-    epd.imageblack.text("Waveshare", 0, 10, 0x00)
-    epd.imagered.text("ePaper-2.13B", 0, 20, 0x00)
-    epd.imageblack.text("Raspberry Pico", 0, 30, 0x00)
-    epd.imagered.text("Hello World", 0, 40, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd.imagered.vline(5, 55, 60, 0x00)
-    epd.imagered.vline(100, 55, 60, 0x00)
-    epd.imageblack.hline(5, 55, 95, 0x00)
-    epd.imageblack.hline(5, 115, 95, 0x00)
-    epd.imagered.line(5, 55, 100, 115, 0x00)
-    epd.imageblack.line(100, 55, 5, 115, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd.imageblack.rect(130, 10, 40, 80, 0x00)
-    epd.imagered.fill_rect(190, 10, 40, 80, 0x00)
-    epd.display()
-    epd.delay_ms(2000)
-
-    epd.Clear(0xff, 0xff)
-    epd.delay_ms(2000)
-    print("sleep")
-    epd.sleep()
@@ -0,0 +1,328 @@
+# *****************************************************************************
+# * | File        :	  Pico_ePaper-2.13-B_V4.py
+# * | Author      :   Waveshare team
+# * | Function    :   Electronic paper driver
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2022-08-22
+# # | Info        :   python demo
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+# The portrait driver and the demo of the panel, moved out of epaper2in13b.py
+# so that the device loads only the landscape driver it uses.
+
+from machine import Pin, SPI, idle, lightsleep
+import framebuf
+import utime
+
+import phase_trace
+from epaper2in13b import EPD_WIDTH, EPD_HEIGHT, RST_PIN, DC_PIN, CS_PIN, BUSY_PIN, FILL_CHUNK_SIZE, \
+    BUSY_WAIT_POLL, BUSY_WAIT_IDLE, BUSY_WAIT_LIGHTSLEEP, BUSY_TIMEOUT_MS, BUSY_SLEEP_SLICE_MS, \
+    EPD_2in13_B_V4_Landscape
+
+
+class EPD_2in13_B_V4_Portrait:
+    def __init__(self):
+        self.reset_pin = Pin(RST_PIN, Pin.OUT)
+
+        self.busy_pin = Pin(BUSY_PIN, Pin.IN, Pin.PULL_UP)
+        self.cs_pin = Pin(CS_PIN, Pin.OUT)
+        if EPD_WIDTH % 8 == 0:
+            self.width = EPD_WIDTH
+        else:
+            self.width = (EPD_WIDTH // 8) * 8 + 8
+        self.height = EPD_HEIGHT
+
+        self.spi = SPI(1)
+        self.spi.init(baudrate=4000_000)
+        self.dc_pin = Pin(DC_PIN, Pin.OUT)
+
+        # Scratch buffers reused by every transfer, so that sending
+        # commands and filling the RAM doesn't allocate on the heap
+        self._byte = bytearray(1)
+        self._chunk = bytearray(FILL_CHUNK_SIZE)
+
+        self.busy_wait = BUSY_WAIT_LIGHTSLEEP
+        self.busy_timeout_ms = BUSY_TIMEOUT_MS
+        # Duration of the last ReadBusy() call
+        self.last_busy_ms = 0
+        self._busy_flag = False
+        # Called with "spi" when a frame starts to be sent and with "busy"
+        # when the panel starts refreshing, for the energy profiling
+        self.phase_hook = None
+
+        self.buffer_balck = bytearray(self.height * self.width // 8)
+        self.buffer_red = bytearray(self.height * self.width // 8)
+        self.imageblack = framebuf.FrameBuffer(self.buffer_balck,
+                                               self.width,
+                                               self.height,
+                                               framebuf.MONO_HLSB)
+        self.imagered = framebuf.FrameBuffer(self.buffer_red,
+                                             self.width,
+                                             self.height,
+                                             framebuf.MONO_HLSB)
+        self.init()
+
+    def digital_write(self, pin, value):
+        pin.value(value)
+
+    def digital_read(self, pin):
+        return pin.value()
+
+    def delay_ms(self, delaytime):
+        utime.sleep_ms(delaytime)
+
+    def spi_writebyte(self, data):
+        for value in data:
+            self._byte[0] = value
+            self.spi.write(self._byte)
+
+    def module_exit(self):
+        self.digital_write(self.reset_pin, 0)
+
+    # Hardware reset
+    def reset(self):
+        self.digital_write(self.reset_pin, 1)
+        self.delay_ms(50)
+        self.digital_write(self.reset_pin, 0)
+        self.delay_ms(2)
+        self.digital_write(self.reset_pin, 1)
+        self.delay_ms(50)
+
+    def send_command(self, command):
+        self._byte[0] = command
+        self.digital_write(self.dc_pin, 0)
+        self.digital_write(self.cs_pin, 0)
+        self.spi.write(self._byte)
+        self.digital_write(self.cs_pin, 1)
+
+    def send_data(self, data):
+        self._byte[0] = data
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        self.spi.write(self._byte)
+        self.digital_write(self.cs_pin, 1)
+
+    def send_data1(self, buf):
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        self.spi.write(buf)
+        self.digital_write(self.cs_pin, 1)
+
+    def send_fill(self, value, count):
+        """ Sends count times the byte value, streaming it from the scratch chunk """
+        chunk = self._chunk
+        for i in range(len(chunk)):
+            chunk[i] = value
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        while count >= len(chunk):
+            self.spi.write(chunk)
+            count -= len(chunk)
+        if count > 0:
+            self.spi.write(memoryview(chunk)[:count])
+        self.digital_write(self.cs_pin, 1)
+
+    def _busy_released(self, pin):
+        self._busy_flag = False
+
+    def ReadBusy(self):
+        """
+        Waits until the panel releases the BUSY pin, for at most busy_timeout_ms.
+        The time spent waiting is stored in last_busy_ms.
+        @return False if the wait timed out
+        """
+        phase_trace.mark("epd_busy")
+        start = utime.ticks_ms()
+        released = True
+        self._busy_flag = True
+        if self.busy_wait != BUSY_WAIT_POLL:
+            self.busy_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._busy_released)
+        while self._busy_flag and self.digital_read(self.busy_pin) == 1:
+            remaining = self.busy_timeout_ms - utime.ticks_diff(utime.ticks_ms(), start)
+            if remaining <= 0:
+                released = False
+                break
+            if self.busy_wait == BUSY_WAIT_LIGHTSLEEP:
+                lightsleep(min(remaining, BUSY_SLEEP_SLICE_MS))
+            elif self.busy_wait == BUSY_WAIT_IDLE:
+                idle()
+            else:
+                self.delay_ms(10)
+        if self.busy_wait != BUSY_WAIT_POLL:
+            self.busy_pin.irq(handler=None)
+
+        self.last_busy_ms = utime.ticks_diff(utime.ticks_ms(), start)
+        phase_trace.mark("epd_ready", 1 if released else 0)
+        if not released:
+            print(f"EPD: BUSY still high after {self.last_busy_ms} ms")
+        self.delay_ms(20)
+        return released
+
+    def _phase(self, name):
+        if name == "spi":
+            phase_trace.mark("epd_spi")
+        if self.phase_hook is not None:
+            self.phase_hook(name)
+
+    def TurnOnDisplay(self):
+        self.send_command(0x20)  # Activate Display Update Sequence
+        self._phase("busy")
+        self.ReadBusy()
+
+    def SetWindows(self, Xstart, Ystart, Xend, Yend):
+        self.send_command(0x44)  # SET_RAM_X_ADDRESS_START_END_POSITION
+        self.send_data((Xstart >> 3) & 0xFF)
+        self.send_data((Xend >> 3) & 0xFF)
+
+        self.send_command(0x45)  # SET_RAM_Y_ADDRESS_START_END_POSITION
+        self.send_data(Ystart & 0xFF)
+        self.send_data((Ystart >> 8) & 0xFF)
+        self.send_data(Yend & 0xFF)
+        self.send_data((Yend >> 8) & 0xFF)
+
+    def SetCursor(self, Xstart, Ystart):
+        self.send_command(0x4E)  # SET_RAM_X_ADDRESS_COUNTER
+        self.send_data(Xstart & 0xFF)
+
+        self.send_command(0x4F)  # SET_RAM_Y_ADDRESS_COUNTER
+        self.send_data(Ystart & 0xFF)
+        self.send_data((Ystart >> 8) & 0xFF)
+
+    def init(self):
+        print('init')
+        self.reset()
+
+        self.ReadBusy()
+        self.send_command(0x12)  # SWRESET
+        self.ReadBusy()
+
+        self.send_command(0x01)  # Driver output control
+        self.send_data(0xf9)
+        self.send_data(0x00)
+        self.send_data(0x00)
+
+        self.send_command(0x11)  # data entry mode
+        self.send_data(0x03)
+
+        self.SetWindows(0, 0, self.width - 1, self.height - 1)
+        self.SetCursor(0, 0)
+
+        self.send_command(0x3C)  # BorderWaveform
+        self.send_data(0x05)
+
+        self.send_command(0x18)  # Read built-in temperature sensor
+        self.send_data(0x80)
+
+        self.send_command(0x21)  # Display update control
+        self.send_data(0x80)
+        self.send_data(0x80)
+
+        self.ReadBusy()
+
+        return 0
+
+    def display(self):
+        self._phase("spi")
+        self.send_command(0x24)
+        self.send_data1(self.buffer_balck)
+
+        self.send_command(0x26)
+        self.send_data1(self.buffer_red)
+
+        self.TurnOnDisplay()
+
+    def Clear(self, colorblack, colorred):
+        self._phase("spi")
+        self.send_command(0x24)
+        self.send_fill(colorblack, self.height * self.width // 8)
+
+        self.send_command(0x26)
+        self.send_fill(colorred, self.height * self.width // 8)
+
+        self.TurnOnDisplay()
+
+    def sleep(self):
+        self.send_command(0x10)
+        self.send_data(0x01)
+
+        self.delay_ms(2000)
+        self.module_exit()
+
+
+if __name__ == '__main__':
+    epd = EPD_2in13_B_V4_Portrait()
+    epd.Clear(0xff, 0xff)
+
+    epd.imageblack.fill(0xff)
+    epd.imagered.fill(0xff)
+    epd.imageblack.text("Waveshare", 0, 10, 0x00)
+    epd.imagered.text("ePaper-2.13B", 0, 25, 0x00)
+    epd.imageblack.text("RPi Pico", 0, 40, 0x00)
+    epd.imagered.text("Hello World", 0, 55, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd.imagered.vline(10, 90, 40, 0x00)
+    epd.imagered.vline(90, 90, 40, 0x00)
+    epd.imageblack.hline(10, 90, 80, 0x00)
+    epd.imageblack.hline(10, 130, 80, 0x00)
+    epd.imagered.line(10, 90, 90, 130, 0x00)
+    epd.imageblack.line(90, 90, 10, 130, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd.imageblack.rect(10, 150, 40, 40, 0x00)
+    epd.imagered.fill_rect(60, 150, 40, 40, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd = EPD_2in13_B_V4_Landscape()
+    epd.Clear(0xff, 0xff)
+
+    epd.imageblack.fill(0xff)
+    epd.imagered.fill(0xff)
+    epd.imageblack.text("Waveshare", 0, 10, 0x00)
+    epd.imagered.text("ePaper-2.13B", 0, 20, 0x00)
+    epd.imageblack.text("Raspberry Pico", 0, 30, 0x00)
+    epd.imagered.text("Hello World", 0, 40, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd.imagered.vline(5, 55, 60, 0x00)
+    epd.imagered.vline(100, 55, 60, 0x00)
+    epd.imageblack.hline(5, 55, 95, 0x00)
+    epd.imageblack.hline(5, 115, 95, 0x00)
+    epd.imagered.line(5, 55, 100, 115, 0x00)
+    epd.imageblack.line(100, 55, 5, 115, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd.imageblack.rect(130, 10, 40, 80, 0x00)
+    epd.imagered.fill_rect(190, 10, 40, 80, 0x00)
+    epd.display()
+    epd.delay_ms(2000)
+
+    epd.Clear(0xff, 0xff)
+    epd.delay_ms(2000)
+    print("sleep")
+    epd.sleep()
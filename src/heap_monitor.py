@@ -0,0 +1,117 @@
+import gc
+import machine
+
+from energy_profiler import PHASES
+
+
+def largest_free_block(step=256):
+    """
+    @return the size of the largest bytearray that can be allocated, to step bytes.
+    MicroPython doesn't report it, it's found by allocating bytearrays and
+    halving the range every time. A failed allocation runs a collection.
+    """
+    low, high = 0, gc.mem_free()
+    while high - low > step:
+        size = (low + high) // 2
+        try:
+            block = bytearray(size)
+            low = size
+        except MemoryError:
+            high = size
+        block = None
+    return low
+
+
+class HeapMonitor:
+    """
+    Tracks the heap over the phases of a cycle, see energy_profiler.PHASES:
+    the lowest gc.mem_free() and the highest gc.mem_alloc() of every phase,
+    sampled at every phase change and every sample_ms by a timer, and the
+    largest free block at the start of the phase when probe_largest.
+    The probe allocates and collects for a few ms, the other core can't
+    allocate meanwhile: pause(function) calls function while the other core
+    is idle and keeps it idle until function returns.
+    The allocated heap includes the garbage not collected yet, the next
+    allocation competes with it too.
+    A cycle starts with the "wake" phase, the last `history` cycles are kept.
+    """
+    def __init__(self, sample_ms=200, probe_largest=True, history=48, pause=None):
+        self.sample_ms = sample_ms
+        self.probe_largest = probe_largest
+        self.pause = pause
+        self.history = history
+        self._timer = None
+        self._phase = None
+        self._reset()
+        # (lowest free, highest allocated, smallest largest block) of every phase of the last cycles
+        self._cycles = []
+
+    def _reset(self):
+        self._free = [None] * len(PHASES)
+        self._alloc = [None] * len(PHASES)
+        self._largest = [None] * len(PHASES)
+
+    def sample(self, timer=None):
+        if self._phase is None:
+            return
+        free = gc.mem_free()
+        alloc = gc.mem_alloc()
+        i = self._phase
+        if self._free[i] is None or free < self._free[i]:
+            self._free[i] = free
+        if self._alloc[i] is None or alloc > self._alloc[i]:
+            self._alloc[i] = alloc
+
+    def phase(self, name, collect=False):
+        """
+        Closes the current phase and starts the given one
+        @param collect: run gc.collect() in between
+        """
+        self.sample()
+        if name == "wake" and self._phase is not None:
+            self._end_cycle()
+        if collect:
+            gc.collect()
+
+        self._phase = PHASES.index(name)
+        if name == "sleep":
+            if self._timer is not None:
+                self._timer.deinit()
+                self._timer = None
+        elif self._timer is None:
+            self._timer = machine.Timer(mode=machine.Timer.PERIODIC, period=self.sample_ms, callback=self.sample)
+        if self.probe_largest and name != "sleep":
+            largest = largest_free_block() if self.pause is None else self.pause(largest_free_block)
+            if self._largest[self._phase] is None or largest < self._largest[self._phase]:
+                self._largest[self._phase] = largest
+        self.sample()
+
+    def _end_cycle(self):
+        self._cycles.append((self._free, self._alloc, self._largest))
+        if len(self._cycles) > self.history:
+            self._cycles.pop(0)
+        self._reset()
+
+    @staticmethod
+    def _extreme(values, lowest):
+        values = [v for v in values if v is not None]
+        if not values:
+            return None
+        return min(values) if lowest else max(values)
+
+    def report(self):
+        if not self._cycles:
+            return "Heap: no complete cycle yet"
+        free, alloc, largest = self._cycles[-1]
+        lowest = self._extreme([self._extreme(cycle[0], True) for cycle in self._cycles], True)
+        lines = [f"Heap: last cycle lowest free {self._extreme(free, True)} bytes, " +
+                 f"peak allocated {self._extreme(alloc, False)} bytes, " +
+                 f"lowest free {lowest} bytes over {len(self._cycles)} cycles"]
+        for i in range(len(PHASES)):
+            if free[i] is None:
+                continue
+            line = f"  {PHASES[i]:<6} free {free[i]:7d} allocated {alloc[i]:7d}"
+            if largest[i] is not None:
+                line += f" largest block {largest[i]:7d}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,249 @@
+import errno
+import gc
+import socket
+import utime
+
+
+# Bytes of unread body that close() reads to keep a connection reusable
+DRAIN_LIMIT = 2048
+
+
+class HTTPError(Exception):
+    pass
+
+
+def _closed_by_server(e):
+    """ @return True if the exception means that an idle connection was dropped """
+    if isinstance(e, HTTPError):
+        return True
+    return isinstance(e, OSError) and len(e.args) > 0 and \
+        e.args[0] in (errno.ECONNRESET, errno.EPIPE, errno.ENOTCONN)
+
+
+def split_url(url):
+    """ @return (scheme, host, port, path) """
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    path = slash + path if slash else "/"
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    else:
+        port = 443 if scheme == "https" else 80
+    return scheme, host, port, path
+
+
+class _Connection:
+    def __init__(self, scheme, host, port, timeout):
+        addr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        self._raw = socket.socket()
+        self._raw.settimeout(timeout)
+        try:
+            self._raw.connect(addr)
+            if scheme == "https":
+                import ssl
+                # The handshake allocates large buffers, they need a collected heap
+                gc.collect()
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.verify_mode = ssl.CERT_NONE
+                self._sock = context.wrap_socket(self._raw, server_hostname=host)
+            else:
+                self._sock = self._raw
+        except Exception:
+            self._raw.close()
+            raise
+        # MicroPython sockets are already streams, CPython ones need a file object
+        makefile = getattr(self._sock, "makefile", None)
+        self.stream = makefile("rwb", 0) if makefile is not None else self._sock
+
+    def settimeout(self, timeout):
+        try:
+            self._sock.settimeout(timeout)
+        except AttributeError:
+            self._raw.settimeout(timeout)
+
+    def send_request(self, method, host, path, headers):
+        request = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+        for name, value in headers.items():
+            request += f"{name}: {value}\r\n"
+        self.stream.write((request + "\r\n").encode())
+
+    def read_head(self):
+        """ @return (status, content length or None, chunked, keep alive) """
+        line = self.stream.readline()
+        if not line:
+            raise HTTPError("Connection closed by the server")
+        parts = line.split(None, 2)
+        status = int(parts[1])
+        length = None
+        chunked = False
+        keep_alive = parts[0] == b"HTTP/1.1"
+        while True:
+            line = self.stream.readline()
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = value == b"chunked"
+            elif name == b"connection":
+                keep_alive = value != b"close"
+        if status == 204 or status == 304:
+            length = 0
+        return status, length, chunked, keep_alive
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class Response:
+    """
+    Response whose body is read from the socket on demand. raw is the
+    response itself, so it can be read like a stream. close() must always
+    be called to give the connection back.
+    """
+    def __init__(self, pool, key, connection, status_code, length, chunked, keep_alive, start):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self.status_code = status_code
+        self._length = length
+        self._chunked = chunked
+        self._chunk_left = 0
+        self._keep_alive = keep_alive
+        self._done = length == 0
+        self._start = start
+        self.raw = self
+
+    def read(self, size=-1):
+        if self._done:
+            return b""
+        stream = self._connection.stream
+        if self._chunked:
+            if self._chunk_left == 0:
+                self._chunk_left = int(stream.readline().split(b";")[0].strip(), 16)
+                if self._chunk_left == 0:
+                    # Skip the trailer
+                    while stream.readline() not in (b"\r\n", b""):
+                        pass
+                    self._done = True
+                    return b""
+            data = stream.read(self._chunk_left if size < 0 else min(size, self._chunk_left))
+            self._chunk_left -= len(data)
+            if self._chunk_left == 0:
+                stream.read(2)  # CRLF after the chunk
+        elif self._length is not None:
+            data = stream.read(self._length if size < 0 else min(size, self._length))
+            self._length -= len(data)
+            if self._length == 0:
+                self._done = True
+        else:
+            # No length, the body ends when the server closes the connection
+            self._keep_alive = False
+            data = stream.read(size) if size >= 0 else stream.read()
+        if not data:
+            self._done = True
+            self._keep_alive = False
+        return data
+
+    def content(self):
+        data = b""
+        while True:
+            chunk = self.read(512)
+            if not chunk:
+                return data
+            data += chunk
+
+    def json(self):
+        import json
+        return json.loads(self.content())
+
+    def close(self, drain=True):
+        """ @param drain: read what's left of a short body to reuse the connection """
+        if self._connection is None:
+            return
+        drained = 0
+        while drain and not self._done and drained <= DRAIN_LIMIT:
+            drained += len(self.read(256))
+        if self._done and self._keep_alive:
+            self._pool._release(self._key, self._connection)
+        else:
+            self._connection.close()
+        self._connection = None
+        self._pool.transfer_ms += utime.ticks_diff(utime.ticks_ms(), self._start)
+
+
+class HTTPPool:
+    """
+    Minimal HTTP/1.1 client that keeps one idle keep-alive connection per
+    host, so that the requests of a wake cycle to the same host pay the
+    TCP and TLS setup only once.
+    The time spent opening connections and in the requests is accumulated
+    in connect_ms and transfer_ms.
+    """
+    def __init__(self):
+        self._idle = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = 0
+        self.connections = 0
+        self.connect_ms = 0
+        self.transfer_ms = 0
+
+    def summary(self):
+        return (f"{self.requests} requests on {self.connections} new connections, " +
+                f"setup {self.connect_ms} ms, transfer {self.transfer_ms} ms")
+
+    def get(self, url, timeout=None, headers=None):
+        return self.request("GET", url, timeout, headers)
+
+    def request(self, method, url, timeout=None, headers=None):
+        """
+        @param timeout: seconds allowed for every socket operation, None to wait forever
+        @return a Response, its body is still to be read
+        """
+        scheme, host, port, path = split_url(url)
+        key = (scheme, host, port)
+        connection = self._idle.pop(key, None)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                start = utime.ticks_ms()
+                connection = _Connection(scheme, host, port, timeout)
+                self.connections += 1
+                self.connect_ms += utime.ticks_diff(utime.ticks_ms(), start)
+
+            start = utime.ticks_ms()
+            try:
+                connection.settimeout(timeout)
+                connection.send_request(method, host, path, headers or {})
+                status, length, chunked, keep_alive = connection.read_head()
+            except (OSError, HTTPError, ValueError, IndexError) as e:
+                connection.close()
+                if reused and _closed_by_server(e):
+                    # The server closed the idle connection, try once with a new one
+                    reused = False
+                    connection = None
+                    continue
+                raise
+            self.requests += 1
+            return Response(self, key, connection, status, length, chunked, keep_alive, start)
+
+    def _release(self, key, connection):
+        old = self._idle.pop(key, None)
+        if old is not None:
+            old.close()
+        self._idle[key] = connection
+
+    def close(self):
+        """ Closes the idle connections, to be called before the WiFi goes down """
+        for connection in self._idle.values():
+            connection.close()
+        self._idle = {}
@@ -1,5 +1,5 @@
 from machine import I2C
-import time
+import utime
 
 # Config Register (R/W)
 _REG_CONFIG = 0x00
@@ -18,6 +18,13 @@ _REG_CURRENT = 0x04
 # CALIBRATION REGISTER (R/W)
 _REG_CALIBRATION = 0x05
 
+# Conversion Ready bit of the bus voltage register
+_CNVR = 0x02
+
+# Conversion time in us of every ADCResolution value
+_CONVERSION_US = (84, 148, 276, 532, 532, 532, 532, 532,
+                  532, 1060, 2130, 4260, 8510, 17020, 34050, 68100)
+
 
 class BusVoltageRange:
     """Constants for ``bus_voltage_range``"""
@@ -69,9 +76,11 @@ class INA219:
         self._cal_value = 0
         self._current_lsb = 0
         self._power_lsb = 0
+        self.mode = Mode.POWERDOW
         self.set_calibration_32V_2A()
 
     def read(self, address):
+        # Not a shared buffer: the energy profiler timer can read in between
         data = self.i2c.readfrom_mem(self.addr, address, 2)
         return ((data[0] * 256) + data[1])
 
@@ -159,29 +168,73 @@ class INA219:
         self.gain = Gain.DIV_8_320MV
         self.bus_adc_resolution = ADCResolution.ADCRES_12BIT_32S
         self.shunt_adc_resolution = ADCResolution.ADCRES_12BIT_32S
-        self.mode = Mode.SANDBVOLT_CONTINUOUS
+        self.set_mode(Mode.SANDBVOLT_CONTINUOUS)
+
+    def set_mode(self, mode):
+        """Writes the config register with the given ``Mode``. Writing a triggered
+           mode starts a single conversion.
+        """
+        starting = mode >= Mode.SVOLT_CONTINUOUS and self.mode < Mode.SVOLT_CONTINUOUS
+        self.mode = mode
         self.config = self.bus_voltage_range << 13 | \
             self.gain << 11 | \
             self.bus_adc_resolution << 7 | \
             self.shunt_adc_resolution << 3 | \
             self.mode
         self.write(_REG_CONFIG, self.config)
+        if starting:
+            # The registers are valid after the first conversion
+            utime.sleep_ms(self.conversion_ms())
+
+    def power_down(self):
+        """Stops the conversions until the next measure() or set_mode()"""
+        self.set_mode(Mode.POWERDOW)
+
+    def conversion_ms(self):
+        """Time of a bus and shunt conversion with the current ADC resolutions"""
+        return (_CONVERSION_US[self.bus_adc_resolution] + _CONVERSION_US[self.shunt_adc_resolution]) // 1000 + 1
+
+    def measure(self, timeout_ms=200):
+        """Returns (bus voltage V, shunt voltage mV, current mA).
+           In continuous mode the last conversion is read. Otherwise a single
+           conversion is triggered, waited for with the Conversion Ready flag,
+           and the sensor is put in power down again.
+        """
+        if self.mode < Mode.SVOLT_CONTINUOUS:
+            self.set_mode(Mode.SANDBVOLT_TRIGGERED)
+            utime.sleep_ms(self.conversion_ms())
+            start = utime.ticks_ms()
+            bus = self.read(_REG_BUSVOLTAGE)
+            while not bus & _CNVR:
+                if utime.ticks_diff(utime.ticks_ms(), start) > timeout_ms:
+                    self.power_down()
+                    raise OSError("INA219 conversion timeout")
+                utime.sleep_ms(1)
+                bus = self.read(_REG_BUSVOLTAGE)
+            shunt = self._signed(self.read(_REG_SHUNTVOLTAGE))
+            # Reading the current clears the Conversion Ready flag
+            current = self._signed(self.read(_REG_CURRENT))
+            self.power_down()
+        else:
+            bus = self.read(_REG_BUSVOLTAGE)
+            shunt = self._signed(self.read(_REG_SHUNTVOLTAGE))
+            current = self._signed(self.read(_REG_CURRENT))
+        return (bus >> 3) * 0.004, shunt * 0.01, current * self._current_lsb
+
+    @staticmethod
+    def _signed(value):
+        if value > 32767:
+            value -= 65536
+        return value
 
     def getShuntVoltage_mV(self):
-        value = self.read(_REG_SHUNTVOLTAGE)
-        if value > 32767:
-            value -= 65535
-        return value * 0.01
+        return self._signed(self.read(_REG_SHUNTVOLTAGE)) * 0.01
 
     def getBusVoltage_V(self):
-        self.read(_REG_BUSVOLTAGE)
         return (self.read(_REG_BUSVOLTAGE) >> 3) * 0.004
 
     def getCurrent_mA(self):
-        value = self.read(_REG_CURRENT)
-        if value > 32767:
-            value -= 65535
-        return value * self._current_lsb
+        return self._signed(self.read(_REG_CURRENT)) * self._current_lsb
 
 
 if __name__ == '__main__':
@@ -203,5 +256,5 @@ if __name__ == '__main__':
         print("Percent:  {:6.1f} %".format(P))
         print("")
 
-        time.sleep(2)
+        utime.sleep(2)
 
@@ -1,31 +1,156 @@
 import re
+import utime
 
 import secrets
-import requests
+from http_client import HTTPPool
+import phase_trace
+
+
+# The responses are read from the socket in chunks of CHUNK_SIZE bytes and
+# split in lines. Only one line at a time is kept in memory, truncated to
+# MAX_LINE_SIZE bytes.
+CHUNK_SIZE = 128
+MAX_LINE_SIZE = 1024
+
+_PRICE_RE = re.compile("([0-9]+\\.[0-9]+)")
+_CHANGE_RE = re.compile("(-?\\$[0-9]+\\.[0-9]+)")
+_PERCENT_RE = re.compile("(-?[0-9]+\\.[0-9]+)")
+_DATE_RE = re.compile("([A-Z][a-z]+ [0-9]+, [0-9]+, [0-9]+:[0-9]+:[0-9]+)")
+_JSON_FIELD_RE = re.compile('"([^"]+)": *"([^"]*)"')
+
+# Fields of the Alpha Vantage "Global Quote" object that are used
+_GLOBAL_QUOTE_KEYS = ("05. price", "09. change", "10. change percent", "07. latest trading day")
 
 
 class RequestException(Exception):
     pass
 
 
+def remaining_s(deadline):
+    """
+    @param deadline: utime.ticks_ms() value, or None for no deadline
+    @return the seconds left before the deadline, to be used as socket timeout
+    """
+    if deadline is None:
+        return None
+    remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+    if remaining <= 0:
+        raise RequestException("Deadline exceeded")
+    return remaining / 1000
+
+
+class LineReader:
+    """
+    Iterates over the lines of a response body without loading it in memory.
+    The largest line buffer used is kept in peak.
+    """
+    def __init__(self, raw, separator=b"\n", deadline=None):
+        self._raw = raw
+        self._separator = separator
+        self._deadline = deadline
+        self.peak = 0
+
+    def __iter__(self):
+        line = bytearray()
+        while True:
+            remaining_s(self._deadline)
+            chunk = self._raw.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            start = 0
+            while start < len(chunk):
+                end = chunk.find(self._separator, start)
+                if end < 0:
+                    self._append(line, chunk[start:])
+                    break
+                self._append(line, chunk[start:end])
+                yield self._decode(line)
+                line = bytearray()
+                start = end + len(self._separator)
+        if line:
+            yield self._decode(line)
+
+    def _append(self, line, data):
+        room = MAX_LINE_SIZE - len(line)
+        if room > 0:
+            line.extend(data[:room])
+        self.peak = max(self.peak, len(line) + CHUNK_SIZE)
+
+    @staticmethod
+    def _decode(line):
+        try:
+            return str(line, "utf-8")
+        except UnicodeError:
+            # A multibyte character cut by the truncation, the line is useless anyway
+            return ""
+
+
 class InternetGetter:
+    ALPHAVANTAGE_URL = "https://www.alphavantage.co"
+    TERMINAL_STOCKS_URL = "http://terminal-stocks.dev"
+    TIMEAPI_URL = "https://timeapi.io"
+
+    # Memory used by the last streaming parse, in bytes
+    last_peak_bytes = 0
+
+    # Shared by all the requests so that the connections are reused
+    http = HTTPPool()
+
     @staticmethod
-    def get_stock_price(symbol):
-        response = requests.get("https://www.alphavantage.co/query?" +
-                                "function=GLOBAL_QUOTE" +
-                                f"&symbol={symbol}" +
-                                "&datatype=json" +
-                                f"&apikey={secrets.ALPHAVANTAGE_API_KEY}")
-        if response.status_code != 200:
-            raise RequestException(f"Returned bad status code: {response.status_code}")
-
-        response_d = response.json()
-        print(response_d)
+    def _get(url, deadline=None, answer_deadline=None):
+        """
+        Sends a GET request, the body is left on the socket.
+        @param deadline: ticks_ms() after which the request is abandoned
+        @param answer_deadline: ticks_ms() before which the server has to start answering,
+                                every read of the body has the same time budget
+        """
+        phase_trace.mark("http_get")
         try:
-            price = response_d["Global Quote"]["05. price"]
-            change = response_d["Global Quote"]["09. change"]
-            change_percent = response_d["Global Quote"]["10. change percent"]
-            date = response_d["Global Quote"]["07. latest trading day"]
+            response = InternetGetter.http.get(
+                url, timeout=remaining_s(answer_deadline if answer_deadline is not None else deadline))
+            phase_trace.mark("http_response")
+            return response
+        except RequestException:
+            raise
+        except Exception as e:
+            raise RequestException(f"Request failed: {e}")
+
+    @staticmethod
+    def get_stock_price(symbol, deadline=None, answer_deadline=None):
+        response = InternetGetter._get(f"{InternetGetter.ALPHAVANTAGE_URL}/query?" +
+                                       "function=GLOBAL_QUOTE" +
+                                       f"&symbol={symbol}" +
+                                       "&datatype=json" +
+                                       f"&apikey={secrets.ALPHAVANTAGE_API_KEY}",
+                                       deadline, answer_deadline)
+        try:
+            if response.status_code != 200:
+                raise RequestException(f"Returned bad status code: {response.status_code}")
+
+            # Splitting on commas gives one "key": "value" pair per line,
+            # whether the JSON is indented or not
+            fields = {}
+            reader = LineReader(response.raw, b",", deadline)
+            for line in reader:
+                match = _JSON_FIELD_RE.search(line)
+                if match is not None and match.group(1) in _GLOBAL_QUOTE_KEYS:
+                    fields[match.group(1)] = match.group(2)
+            InternetGetter.last_peak_bytes = reader.peak
+        except RequestException:
+            response.close(drain=False)
+            raise
+        except Exception as e:
+            response.close(drain=False)
+            raise RequestException(f"Cannot read response: {e}")
+        finally:
+            response.close()
+
+        print(fields)
+        try:
+            price = fields["05. price"]
+            change = fields["09. change"]
+            change_percent = fields["10. change percent"]
+            date = fields["07. latest trading day"]
 
             # price is in the format xx.xxxx
             price = float(price)
@@ -39,47 +164,92 @@ class InternetGetter:
             raise RequestException(f"Invalid json response, can't find '{e}'")
 
     @staticmethod
-    def get_terminal_stock_price(symbol):
-        response = requests.get(f"http://terminal-stocks.dev/{symbol}")
-        if response.status_code != 200:
-            raise RequestException(f"Returned bad status code: {response.status_code}")
+    def get_stock_prices(symbols, deadline=None, answer_deadline=None):
+        """
+        Alpha Vantage has no batch quote endpoint, so there's one request per symbol.
+        answer_deadline applies to the first one: once the server answered,
+        the next requests have until deadline.
+        """
+        quotes = []
+        for symbol in symbols:
+            quotes.append(InternetGetter.get_stock_price(symbol, deadline, answer_deadline))
+            answer_deadline = None
+        return quotes
 
-        print(response.text)
+    @staticmethod
+    def get_terminal_stock_price(symbol, deadline=None, answer_deadline=None):
+        return InternetGetter.get_terminal_stock_prices([symbol], deadline, answer_deadline)[0]
 
+    @staticmethod
+    def get_terminal_stock_prices(symbols, deadline=None, answer_deadline=None):
+        """
+        Gets the quotes of all symbols with a single request.
+        @return a list of (price, change, change_percent, date), in the same order of symbols
+        """
+        response = InternetGetter._get(f"{InternetGetter.TERMINAL_STOCKS_URL}/{','.join(symbols)}",
+                                       deadline, answer_deadline)
         try:
-            resp_str = response.text.split("\n")
-            stock_info = resp_str[4].split("│")
-            date_line = resp_str[6]
-            price = re.search("([0-9]+\.[0-9]+)", stock_info[2])
-            change = re.search("(-?\$[0-9]+\.[0-9]+)", stock_info[3])
-            change_percent = re.search("(-?[0-9]+\.[0-9]+)", stock_info[4])
-            # Time is UTC, there's not enough space to print it
-            date = re.search("([A-Z][a-z]+ [0-9]+, [0-9]+, [0-9]+:[0-9]+:[0-9]+)", date_line)
-
-            print(f"Price {price.groups()}; " +
-                  f"change {change.groups()}; " +
-                  f"change percent {change_percent.groups()}; " +
-                  f"date {date.groups()}")
-
-            return (float(price.groups()[0]),
-                    float(change.groups()[0].replace("$", "")),
-                    float(change_percent.groups()[0]),
-                    date.groups()[0])
+            if response.status_code != 200:
+                raise RequestException(f"Returned bad status code: {response.status_code}")
+
+            quotes = []
+            date = None
+            reader = LineReader(response.raw, b"\n", deadline)
+            for line in reader:
+                stock_info = line.split("│")
+                # The table has one row per stock, the header doesn't have a price
+                if len(stock_info) > 4:
+                    price = _PRICE_RE.search(stock_info[2])
+                    if price is None:
+                        continue
+                    change = _CHANGE_RE.search(stock_info[3])
+                    change_percent = _PERCENT_RE.search(stock_info[4])
+                    if change is None or change_percent is None:
+                        raise RequestException(f"Cannot parse row: {line}")
+                    quotes.append((float(price.group(1)),
+                                   float(change.group(1).replace("$", "")),
+                                   float(change_percent.group(1))))
+                elif date is None:
+                    # Time is UTC, there's not enough space to print it
+                    date = _DATE_RE.search(line)
+            InternetGetter.last_peak_bytes = reader.peak
+        except RequestException:
+            response.close(drain=False)
+            raise
         except Exception as e:
+            response.close(drain=False)
             raise RequestException(f"Cannot parse output: {e}")
+        finally:
+            response.close()
+
+        if len(quotes) != len(symbols):
+            raise RequestException(f"Expected {len(symbols)} stocks, found {len(quotes)}")
+        if date is None:
+            raise RequestException("Date not found")
+
+        print(f"Quotes {quotes}; date {date.group(1)}; parser peak {reader.peak} bytes")
+        return [quote + (date.group(1),) for quote in quotes]
 
     @staticmethod
-    def get_current_time(timezone):
+    def get_current_time(timezone, deadline=None):
         try:
-            response = requests.get(f"https://timeapi.io/api/Time/current/zone?timeZone={timezone}")
+            response = InternetGetter.http.get(
+                f"{InternetGetter.TIMEAPI_URL}/api/Time/current/zone?timeZone={timezone}",
+                timeout=remaining_s(deadline))
         except Exception as e:
             print(f"Exception while getting current time: {e}")
             return "N.A."
-        if response.status_code != 200:
-            # Don't fail just for this
+        try:
+            if response.status_code != 200:
+                # Don't fail just for this
+                return "N.A."
+            response_d = response.json()
+        except Exception as e:
+            print(f"Exception while getting current time: {e}")
             return "N.A."
+        finally:
+            response.close()
 
-        response_d = response.json()
         print(response_d)
         try:
             return response_d["dateTime"].rsplit('.', 1)[0]  # Delete the ns from the timestamp
@@ -0,0 +1,145 @@
+import utime
+
+
+# Standard UTC offset in minutes and daylight saving rule of the supported timezones
+TIMEZONES = {
+    "UTC": (0, None),
+    "Europe/London": (0, "EU"),
+    "Europe/Dublin": (0, "EU"),
+    "Europe/Lisbon": (0, "EU"),
+    "Europe/Paris": (60, "EU"),
+    "Europe/Amsterdam": (60, "EU"),
+    "Europe/Berlin": (60, "EU"),
+    "Europe/Brussels": (60, "EU"),
+    "Europe/Madrid": (60, "EU"),
+    "Europe/Rome": (60, "EU"),
+    "Europe/Stockholm": (60, "EU"),
+    "Europe/Vienna": (60, "EU"),
+    "Europe/Warsaw": (60, "EU"),
+    "Europe/Zurich": (60, "EU"),
+    "Europe/Athens": (120, "EU"),
+    "Europe/Helsinki": (120, "EU"),
+    "Europe/Moscow": (180, None),
+    "America/New_York": (-300, "US"),
+    "America/Chicago": (-360, "US"),
+    "America/Denver": (-420, "US"),
+    "America/Phoenix": (-420, None),
+    "America/Los_Angeles": (-480, "US"),
+    "Asia/Dubai": (240, None),
+    "Asia/Kolkata": (330, None),
+    "Asia/Shanghai": (480, None),
+    "Asia/Hong_Kong": (480, None),
+    "Asia/Singapore": (480, None),
+    "Asia/Tokyo": (540, None),
+    "Australia/Sydney": (600, "AU"),
+}
+
+
+def days_from_civil(y, m, d):
+    """ @return the days between 1970-01-01 and the given date """
+    y -= 1 if m <= 2 else 0
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m - 3 if m > 2 else m + 9) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    """ @return (year, month, day) of the date days after 1970-01-01 """
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + 3 if mp < 10 else mp - 9
+    return yoe + era * 400 + (1 if m <= 2 else 0), m, d
+
+
+def weekday(days):
+    """ @return the day of the week, 0 is Monday, of the date days after 1970-01-01 """
+    return (days + 3) % 7
+
+
+def _sunday(y, m, n):
+    """ @return the days since 1970 of the n-th Sunday of the month, or of the last one if n is -1 """
+    if n > 0:
+        first = days_from_civil(y, m, 1)
+        return first + (6 - weekday(first)) % 7 + 7 * (n - 1)
+    last = days_from_civil(y + 1, 1, 1) - 1 if m == 12 else days_from_civil(y, m + 1, 1) - 1
+    return last - (weekday(last) + 1) % 7
+
+
+def utc_offset_min(timezone, utc_s):
+    """ @param utc_s: seconds since 1970-01-01 UTC """
+    std, rule = TIMEZONES[timezone]
+    if rule is None:
+        return std
+    y = civil_from_days(utc_s // 86400)[0]
+    if rule == "EU":
+        # From the last Sunday of March to the last Sunday of October, at 01:00 UTC
+        dst = _sunday(y, 3, -1) * 86400 + 3600 <= utc_s < _sunday(y, 10, -1) * 86400 + 3600
+    elif rule == "US":
+        # From the second Sunday of March to the first Sunday of November, at 02:00 local time
+        dst = _sunday(y, 3, 2) * 86400 + 7200 - std * 60 <= utc_s < \
+            _sunday(y, 11, 1) * 86400 + 7200 - (std + 60) * 60
+    else:
+        # AU: from the first Sunday of October to the first Sunday of April of the next year
+        dst = utc_s < _sunday(y, 4, 1) * 86400 + 10800 - (std + 60) * 60 or \
+            utc_s >= _sunday(y, 10, 1) * 86400 + 7200 - std * 60
+    return std + 60 if dst else std
+
+
+def format_time(seconds):
+    """ @return seconds since 1970 as "YYYY-MM-DDTHH:MM:SS" """
+    y, m, d = civil_from_days(seconds // 86400)
+    s = seconds % 86400
+    return f"{y:04d}-{m:02d}-{d:02d}T{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+
+
+class LocalClock:
+    """
+    Keeps the time with the RTC, synchronized over NTP at most every sync_interval_s.
+    The timezone conversion is done on the device with the TIMEZONES table.
+    """
+    def __init__(self, timezone, sync_interval_s, ntp_host="pool.ntp.org"):
+        if timezone not in TIMEZONES:
+            raise ValueError(f"Unknown timezone {timezone}")
+        self.timezone = timezone
+        self.sync_interval_s = sync_interval_s
+        self.ntp_host = ntp_host
+        self._synced_at = None
+
+    def synced(self) -> bool:
+        return self._synced_at is not None
+
+    def sync_due(self) -> bool:
+        return self._synced_at is None or utime.time() - self._synced_at >= self.sync_interval_s
+
+    def sync(self) -> bool:
+        """ Sets the RTC from NTP, it needs the network. @return True on success """
+        import ntptime
+        ntptime.host = self.ntp_host
+        ntptime.timeout = 2
+        try:
+            ntptime.settime()
+        except Exception as e:
+            print(f"LocalClock: NTP sync failed: {e}")
+            return False
+        self._synced_at = utime.time()
+        print(f"LocalClock: synced, now {self.now()}")
+        return True
+
+    def utc_seconds(self):
+        """ @return the seconds since 1970-01-01 UTC, whatever the epoch of the port """
+        y, m, d, hh, mm, ss = utime.gmtime()[:6]
+        return days_from_civil(y, m, d) * 86400 + hh * 3600 + mm * 60 + ss
+
+    def now(self):
+        """ @return the local time as "YYYY-MM-DDTHH:MM:SS", or None if the clock was never synced """
+        if not self.synced():
+            return None
+        utc_s = self.utc_seconds()
+        return format_time(utc_s + utc_offset_min(self.timezone, utc_s) * 60)
@@ -1,11 +1,33 @@
+import utime
+
+# The ticks count from the reset. The imports below take most of the boot,
+# less with the .mpy files of tools/build_mpy.py. The network modules are
+# imported by setup_network(), after the cached quote is on the panel.
+_BOOT_MS = utime.ticks_ms()
+
+import gc
 import machine
 
-from connection import Connection
-from internet_getter import InternetGetter, RequestException
-import secrets
+from quote_cache import QuoteCache
+from local_clock import LocalClock
+from market_schedule import MarketSchedule
+from energy_profiler import EnergyProfiler
+from heap_monitor import HeapMonitor
+from power_policy import PowerPolicy
+from display_worker import DisplayWorker
+from price_history import PriceHistory
+from quote_history import QuoteHistory
+import phase_trace
 import epaper2in13b
 import ina219
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    asyncio = None
+
+_IMPORTS_MS = utime.ticks_diff(utime.ticks_ms(), _BOOT_MS)
+
 
 class entry_point:
     REFRESH_MS = 30 * 60 * 1000  # 30 minutes
@@ -16,63 +38,309 @@ class entry_point:
     STOCK_NAME = "NASDAQ: ARM"
     TIMEZONE = "Europe/Paris"
 
+    # Names from quote_provider.PROVIDERS. The fallback is used when the
+    # primary fails or doesn't answer within HEDGE_AFTER_MS, set it to None
+    # to use only the primary.
+    QUOTE_PROVIDER = "terminal-stocks"
+    FALLBACK_PROVIDER = "alphavantage"
+    FETCH_DEADLINE_MS = 20 * 1000
+    HEDGE_AFTER_MS = 5 * 1000
+    TIME_DEADLINE_MS = 5 * 1000
+
+    # The "Last lookup" time comes from the RTC, synchronized over NTP at
+    # most this often. TIMEZONE must be in local_clock.TIMEZONES.
+    NTP_SYNC_INTERVAL_S = 24 * 60 * 60
+    NTP_HOST = "pool.ntp.org"
+
+    # When the clock is synced, refresh only while the exchange is open (plus
+    # once after the close) and sleep until the next open otherwise.
+    # FAST_REFRESH_MS, if set, is used in the first and last 30 minutes of the session.
+    MARKET_AWARE_REFRESH = True
+    FAST_REFRESH_MS = None
+    # Longest single lightsleep, longer waits are split. The rp2 port counts
+    # it in microseconds on 32 bits and raises ValueError from 71.6 minutes.
+    MAX_SLEEP_MS = 60 * 60 * 1000
+
+    # Run the cycle on uasyncio, see run_async(). With False, or without
+    # uasyncio, the sequential run() is used.
+    USE_ASYNCIO = True
+    # Send the frames and wait for the refreshes on core 1, see display_worker.py
+    DISPLAY_ON_CORE1 = True
+
+    # Refresh the panel only once per cycle, with the quote or the error.
+    # The LED blinks while connecting instead of the "Connecting..." and
+    # "Fetching data" screens, that take a full refresh each.
+    QUIET_MODE = True
+    LED_BLINK_MS = 250
+
+    # The last access point and IP lease are saved here and tried first.
+    # With WIFI_STATIC_IP the saved address is reused without asking DHCP.
+    WIFI_CACHE_FILE = "wifi_cache.json"
+    WIFI_STATIC_IP = False
+
+    # The last good quotes are kept here and shown, marked as offline,
+    # while the network or the API are not available
+    QUOTE_CACHE_FILE = "quote_cache.json"
+    # Frames that differ only inside these (x, y, w, h) areas don't refresh the panel.
+    # The default ignores the "Last lookup" time, set it to () to refresh at every lookup.
+    REFRESH_IGNORE_AREAS = ((10, 70, 100, 30),)
+    # The battery charge is shown in steps of this many percent, so that its
+    # small variations don't make an unchanged quote refresh the panel
+    BATTERY_STEP_PERCENT = 5
+
+    # List of (symbol, label) to show as a table instead of STOCK_SYMBOL.
+    # All the symbols of a page are fetched with one request, the pages
+    # rotate at every refresh.
+    WATCHLIST = ()
+    WATCHLIST_ROWS = 8  # Rows per page
+    WATCHLIST_IGNORE_AREAS = ((150, 110, 90, 8),)
+
+    # The last SPARKLINE_POINTS prices of STOCK_SYMBOL are drawn as a line in
+    # SPARKLINE_AREA (x, y, w, h), the segments ending on a down day in red.
+    # SPARKLINE_SPAN_S limits it to the recent prices, e.g. 24 * 60 * 60 for
+    # an intraday chart. SPARKLINE_POINTS = 0 disables it.
+    SPARKLINE_POINTS = 96
+    SPARKLINE_SPAN_S = None
+    SPARKLINE_AREA = (120, 64, 115, 40)
+
+    # Once the clock is synced, every quote is appended to HISTORY_FILE,
+    # formatted with the symbol. It's a ring of HISTORY_RECORDS records of 16
+    # bytes, written every HISTORY_BATCH quotes, see quote_history.py. The
+    # sparkline starts from it after a reset. None disables it.
+    HISTORY_FILE = "history_{}.bin"
+    HISTORY_RECORDS = 1024
+    HISTORY_BATCH = 8
+
+    # With the UPS, the current is integrated over the phases of every cycle
+    # and printed with the projected battery life at every wake up.
+    # SLEEP_CURRENT_MA is the consumption in lightsleep, that can't be measured.
+    ENERGY_PROFILING = True
+    ENERGY_SAMPLE_MS = 200
+    BATTERY_CAPACITY_MAH = 1000
+    SLEEP_CURRENT_MA = 2.0
+
+    # As the battery discharges, power_policy.POWER_LEVELS stretch the refresh
+    # intervals and drop the status screens, the fallback provider and the
+    # fast retries. Set it to False to always work as with a full battery.
+    BATTERY_SAVER = True
+
+    # The ticks_us() of the phases of the last PHASE_TRACE_SLOTS cycles are
+    # kept in this file, see phase_trace.py. None disables the trace.
+    PHASE_TRACE_FILE = "phase_trace.bin"
+    PHASE_TRACE_SLOTS = 64
+
+    # The lowest free and highest allocated heap of every phase, see
+    # heap_monitor.py, are printed at every wake up. HEAP_PROBE_LARGEST also
+    # looks for the largest free block at every phase change, it takes a few
+    # ms and collections, run between two frames of the display worker.
+    # gc.collect() runs at the start of GC_PHASES, "fetch" is before the TLS
+    # handshakes, and before every new connection.
+    HEAP_MONITOR = True
+    HEAP_SAMPLE_MS = 200
+    HEAP_PROBE_LARGEST = True
+    GC_PHASES = ("wake", "fetch", "render")
+
     def __init__(self):
-        self._display = epaper2in13b.EPD_2in13_B_V4_Landscape()
-        self._connection = Connection(secrets.WIFI_CREDENTIALS)
+        # The long-lived buffers first, on a clean heap and always in the
+        # same order, so that what the cycles allocate and free doesn't end
+        # up between them: the framebuffers of the driver and of the worker,
+        # then the rings of the prices and of the quote history.
+        gc.collect()
+        epd = epaper2in13b.EPD_2in13_B_V4_Landscape()
+        self._display = epd
+        if self.WATCHLIST:
+            self._display.fingerprint_ignore = self.WATCHLIST_IGNORE_AREAS
+        else:
+            self._display.fingerprint_ignore = self.REFRESH_IGNORE_AREAS
+        self._worker = None
+        if self.DISPLAY_ON_CORE1:
+            self._worker = DisplayWorker(self._display)
+            self._display = self._worker
+        self._page = 0
+        self._history_files = {}
+        self._history = PriceHistory(self.SPARKLINE_POINTS) if self.SPARKLINE_POINTS else None
+        if self._history is not None and self.HISTORY_FILE and not self.WATCHLIST:
+            for timestamp, price, change, change_percent in \
+                    self.history_file(self.STOCK_SYMBOL).last(self.SPARKLINE_POINTS):
+                self._history.add(timestamp, price, change_percent)
+        self._cache = QuoteCache(self.QUOTE_CACHE_FILE)
+        self._clock = LocalClock(self.TIMEZONE, self.NTP_SYNC_INTERVAL_S, self.NTP_HOST)
+        self._schedule = MarketSchedule(self.REFRESH_MS, fast_refresh_ms=self.FAST_REFRESH_MS)
+        # Created by setup_network()
+        self._quotes = None
+        self._connection = None
+        self._boot_reported = False
+        # When the last quote is on the panel the progress screens are not
+        # shown, so an unchanged quote doesn't cause any refresh
+        self._showing_quote = False
         self._led = machine.Pin("LED", mode=machine.Pin.OUT)
+        self._led_timer = None
         try:
             self._ups = ina219.INA219(addr=0x43)
+            # Only converting when it's read, see INA219.measure()
+            self._ups.power_down()
         except Exception as e:
             # UPS not connected
             print(f"Exception on I2C bus: {e}")
             self._ups = None
+        self._profiler = None
+        if self._ups is not None and self.ENERGY_PROFILING:
+            self._profiler = EnergyProfiler(self._ups, self.ENERGY_SAMPLE_MS,
+                                            sleep_current_ma=self.SLEEP_CURRENT_MA,
+                                            capacity_mah=self.BATTERY_CAPACITY_MAH,
+                                            sent_bytes=lambda: epd.sent_bytes)
+        self._display.phase_hook = self._display_phase
+        if self.PHASE_TRACE_FILE:
+            phase_trace.start(self.PHASE_TRACE_FILE, self.PHASE_TRACE_SLOTS)
+        self._policy = PowerPolicy()
+        self._heap = None
+        # CPython's gc, e.g. in the host simulator, doesn't have mem_free()
+        if self.HEAP_MONITOR and hasattr(gc, "mem_free"):
+            self._heap = HeapMonitor(self.HEAP_SAMPLE_MS, self.HEAP_PROBE_LARGEST,
+                                     pause=self._worker.between_frames if self._worker is not None else None)
+        # What the setup left behind, before the worker allocates its stack
+        gc.collect()
+        if self._worker is not None:
+            self._worker.start()
+
+    def _phase(self, name):
+        """ Marks the start of a phase of the cycle, one of energy_profiler.PHASES """
+        if self._profiler is not None:
+            self._profiler.phase(name)
+        collect = name in self.GC_PHASES
+        if self._heap is not None:
+            self._heap.phase(name, collect)
+        elif collect:
+            gc.collect()
+        if name == "wake":
+            phase_trace.begin()
+        phase_trace.mark(name)
+        if name == "sleep":
+            phase_trace.end()
+
+    def _display_phase(self, name):
+        """ Phases started by the display driver, the first one ends the boot """
+        if not self._boot_reported:
+            self._boot_reported = True
+            print(f"Boot: first frame {utime.ticks_ms()} ms after the reset, imports {_IMPORTS_MS} ms")
+        if self._profiler is not None:
+            self._profiler.phase(name)
+
+    def setup_network(self):
+        """ Imports the network modules and creates the connection and the quote service, once """
+        if self._connection is not None:
+            return
+        from connection import Connection
+        from quote_provider import PROVIDERS, QuoteService
+        import secrets
+        self._quotes = QuoteService(PROVIDERS[self.QUOTE_PROVIDER](),
+                                    PROVIDERS[self.FALLBACK_PROVIDER]() if self.FALLBACK_PROVIDER else None,
+                                    deadline_ms=self.FETCH_DEADLINE_MS,
+                                    hedge_ms=self.HEDGE_AFTER_MS)
+        if self.BATTERY_SAVER:
+            self._quotes.use_fallback = self.power_level().fallback
+        self._connection = Connection(secrets.WIFI_CREDENTIALS, self.WIFI_CACHE_FILE, self.WIFI_STATIC_IP)
 
     def die(self):
         print("FATAL ERROR - The board is going to shut down")
 
+        for history in self._history_files.values():
+            history.flush()
+
+        self._phase("render")
         self._display.imagered.text("Device is off", 130, 110, 0x00)
         self._display.display()
 
+        self.stop_worker()
         self.set_devices_low_power()
         while True:
             # Go in low power mode
-            machine.lightsleep(self.REFRESH_MS)
+            self.lightsleep(self.REFRESH_MS)
+
+    def lightsleep(self, sleep_ms):
+        """ machine.lightsleep() in slices of MAX_SLEEP_MS, the refresh intervals of the policy are longer """
+        while sleep_ms > 0:
+            machine.lightsleep(min(sleep_ms, self.MAX_SLEEP_MS))
+            sleep_ms -= self.MAX_SLEEP_MS
+
+    def stop_worker(self):
+        """ Core 1 has to be stopped before the lightsleep """
+        if self._worker is not None:
+            self._worker.stop()
 
     def set_devices_low_power(self):
         print("Shutting down devices")
-        self._connection.disconnect()
+        if self._connection is not None:
+            from internet_getter import InternetGetter
+            InternetGetter.http.close()
+            self._connection.disconnect()
         self._display.sleep()
         self._led.value(0)
 
     def wake_up_devices(self):
         self._led.value(1)
-        self._display.reset()
+        # The hardware reset that ends the deep sleep also restores the
+        # default data entry mode, init() sets it again. The RAM is kept.
+        self._display.init()
         # The connecton is restored later
 
     def init_devices(self):
         print("Init devices")
+        self._phase("wake")
         self._led.value(1)
-        self._display.Clear(0xff, 0xff)
-        self._display.display()
+        self.read_battery()
+        # The last known quote is shown right away, while the network comes up.
+        # In quiet mode the blank panel is left as it is until the first result.
+        if not self.show_cached(stale=True) and not self.QUIET_MODE:
+            self._display.Clear(0xff, 0xff)
+            self._display.display()
 
-    def display_battery(self):
+    def status_screens(self):
+        """ @return True if the progress of the cycle is shown on the panel """
+        return not self.QUIET_MODE and not self._showing_quote and self.power_level().status_screens
+
+    def blink_led(self, blink):
+        """ Blinks the LED until called with False, then leaves it on """
+        if blink and self._led_timer is None:
+            self._led_timer = machine.Timer(mode=machine.Timer.PERIODIC, period=self.LED_BLINK_MS,
+                                            callback=lambda timer: self._led.toggle())
+        elif not blink and self._led_timer is not None:
+            self._led_timer.deinit()
+            self._led_timer = None
+            self._led.value(1)
+
+    def read_battery(self):
+        """ Reads the UPS once per cycle and updates the power policy """
         if self._ups is None:
             print("No battery detected")
             return
 
-        bus_voltage = self._ups.getBusVoltage_V()  # voltage on V- (load side)
-        current = self._ups.getCurrent_mA()  # current in mA
-
-        P = (bus_voltage - 3) / 1.2 * 100
-        if (P < 0):
-            P = 0
-        elif (P > 100):
-            P = 100
+        try:
+            # Voltage on V- (load side), shunt voltage and current in mA
+            bus_voltage, shunt_voltage, current = self._ups.measure()
+        except OSError as e:
+            print(f"Cannot read the battery: {e}")
+            return
 
         # INA219 measure bus voltage on the load side. So PSU voltage = bus_voltage + shunt_voltage
         print(f"Voltage:  {bus_voltage:6.3f} V")
         print(f"Current:  {current / 1000:6.3f} A")
-        print(f"Percent:  {P:5.1f} %")
+        level = self._policy.update(bus_voltage, current)
+        print(f"Percent:  {self._policy.percent:5.1f} % (smoothed), power level {level.name}")
+        if self.BATTERY_SAVER and self._quotes is not None:
+            self._quotes.use_fallback = level.fallback
+
+    def power_level(self):
+        """ @return the power_policy.PowerLevel of this cycle """
+        if self.BATTERY_SAVER:
+            return self._policy.level
+        return self._policy.levels[0]
+
+    def display_battery(self):
+        P = self._policy.percent
+        if P is None:
+            return
+        P = int(P + self.BATTERY_STEP_PERCENT / 2) // self.BATTERY_STEP_PERCENT * self.BATTERY_STEP_PERCENT
 
         if (P < 30):  # Charge state under 30%
             fb = self._display.imagered
@@ -86,7 +354,7 @@ class entry_point:
         if fill_px < 20:
             fb.rect(10 + fill_px, 108, 20 - fill_px, 10, 0x00)
         fb.fill_rect(30, 110, 2, 6, 0x00)  # This is the positive terminal bump
-        fb.text(f"{P:5.1f}%", 34, 110, 0x00)
+        fb.text(f"{P:3d}%", 34, 110, 0x00)
 
     def prepare_screen_layout(self):
         self._display.imageblack.fill(0x00)
@@ -95,90 +363,282 @@ class entry_point:
         self._display.imagered.fill(0xff)
         self._display.imageblack.rect(5, 10, 240, 115, 0x00)
 
+    def watchlist_page(self):
+        """ @return the part of WATCHLIST shown at this refresh and the page number """
+        pages = (len(self.WATCHLIST) + self.WATCHLIST_ROWS - 1) // self.WATCHLIST_ROWS
+        page = self._page % pages
+        return self.WATCHLIST[page * self.WATCHLIST_ROWS:(page + 1) * self.WATCHLIST_ROWS], page, pages
+
+    def display_quote(self, price, change, change_percent, date, current_time):
+        if (change_percent < 0):
+            fb = self._display.imagered
+        else:
+            fb = self._display.imageblack
+        self._display.imageblack.text(f"{self.STOCK_NAME}", 80, 15, 0x00)
+        self._display.imageblack.hline(15, 25, 220, 0x00)
+        fb.text(f"Price  {price:.2f}$", 10, 30, 0x00)
+        fb.text(f"Change {change:.2f}$ {change_percent:.2f}%", 10, 40, 0x00)
+        fb.text(f"Date   {date}", 10, 50, 0x00)
+        self._display.imageblack.text("Last lookup", 10, 70, 0x00)
+        self._display.imageblack.text(f"{current_time[:10]}", 10, 80, 0x00)
+        self._display.imageblack.text(f"{current_time[11:]}", 10, 90, 0x00)
+
+    def display_sparkline(self):
+        if self._history is None:
+            return
+        since = 0
+        if self.SPARKLINE_SPAN_S:
+            since = self._clock.utc_seconds() - self.SPARKLINE_SPAN_S
+        x, y, w, h = self.SPARKLINE_AREA
+        self._history.draw(self._display.imageblack, self._display.imagered, x, y, w, h, since)
+
+    def display_watchlist(self, entries, quotes, page, pages, current_time):
+        title = "Watchlist" if pages == 1 else f"Watchlist {page + 1}/{pages}"
+        self._display.imageblack.text(title, 125 - len(title) * 4, 15, 0x00)
+        self._display.imageblack.hline(15, 25, 220, 0x00)
+        y = 30
+        for (symbol, label), (price, change, change_percent, date) in zip(entries, quotes):
+            if (change_percent < 0):
+                fb = self._display.imagered
+            else:
+                fb = self._display.imageblack
+            fb.text(f"{label[:8]:<8}{price:>9.2f}{change_percent:>+8.2f}%", 10, y, 0x00)
+            y += 10
+        # Only the time, the date doesn't fit next to the battery
+        self._display.imageblack.text(f"@ {current_time[11:16]}", 150, 110, 0x00)
+
+    def store_quotes(self, symbols, quotes, current_time):
+        """ Saves the fetched quotes in the cache, the history files and the sparkline """
+        self._cache.update(symbols, quotes, current_time)
+        timestamp = self._clock.utc_seconds()
+        if self.HISTORY_FILE and self._clock.synced():
+            for symbol, (price, change, change_percent, date) in zip(symbols, quotes):
+                self.history_file(symbol).append(timestamp, price, change, change_percent)
+        if self._history is not None and not self.WATCHLIST:
+            price, change, change_percent, date = quotes[0]
+            self._history.add(timestamp, price, change_percent)
+
+    def history_file(self, symbol):
+        """ @return the QuoteHistory of symbol, opened at the first use """
+        history = self._history_files.get(symbol)
+        if history is None:
+            history = QuoteHistory(self.HISTORY_FILE.format(symbol), self.HISTORY_RECORDS, self.HISTORY_BATCH)
+            self._history_files[symbol] = history
+        return history
+
+    def displayed_symbols(self):
+        if self.WATCHLIST:
+            entries = self.watchlist_page()[0]
+            return [symbol for symbol, _ in entries]
+        return [self.STOCK_SYMBOL]
+
+    def show_cached(self, stale):
+        """
+        Displays the cached quotes of the symbols on screen, with a marker if they are stale.
+        @return False if some of them are not in the cache
+        """
+        symbols = self.displayed_symbols()
+        quotes = [self._cache.get(symbol) for symbol in symbols]
+        if None in quotes:
+            return False
+        # The oldest of the page
+        lookup_time = min(self._cache.lookup_time(symbol) for symbol in symbols)
+
+        self._phase("render")
+        self.prepare_screen_layout()
+        self.display_battery()
+        if self.WATCHLIST:
+            entries, page, pages = self.watchlist_page()
+            self.display_watchlist(entries, quotes, page, pages, lookup_time)
+        else:
+            price, change, change_percent, date = quotes[0]
+            self.display_quote(price, change, change_percent, date, lookup_time)
+            self.display_sparkline()
+        if stale:
+            self._display.imagered.text("offline", 185, 15, 0x00)
+        self._display.display()
+        self._showing_quote = True
+        return True
+
+    def lookup_time(self, sync=True):
+        """
+        @param sync: synchronize the clock with NTP if it's due
+        @return the local time, timeapi.io is asked only if NTP never worked
+        """
+        phase_trace.mark("time")
+        if sync and self._clock.sync_due():
+            self._clock.sync()
+        current_time = self._clock.now()
+        if current_time is None:
+            from internet_getter import InternetGetter
+            current_time = InternetGetter.get_current_time(
+                self.TIMEZONE, utime.ticks_add(utime.ticks_ms(), self.TIME_DEADLINE_MS))
+        return current_time
+
+    def sleep_time_ms(self, for_failure):
+        level = self.power_level()
+        if for_failure and level.fast_retry:
+            return self.REFRESH_MS_WHEN_FAILED
+        refresh_ms = self.REFRESH_MS * level.refresh_factor
+        if self.MARKET_AWARE_REFRESH and self._clock.synced():
+            self._schedule.refresh_ms = refresh_ms
+            if self.FAST_REFRESH_MS is not None:
+                self._schedule.fast_refresh_ms = self.FAST_REFRESH_MS * level.refresh_factor
+            now = self._clock.utc_seconds()
+            sleep_ms = self._schedule.next_wake_ms(now)
+            print(f"Schedule: {self._schedule.describe(now)}, next refresh in {sleep_ms // 60000} min")
+            return sleep_ms
+        return refresh_ms
+
     def _wait(self, for_failure):
+        sleep_ms = self.sleep_time_ms(for_failure)
+
         # Go in low power mode
         print("Going to sleep")
+        self.stop_worker()
+        self._phase("sleep")
         self.set_devices_low_power()
-        machine.lightsleep(self.REFRESH_MS_WHEN_FAILED if for_failure else self.REFRESH_MS)
+        self.lightsleep(sleep_ms)
 
         print("Waking up")
+        self._phase("wake")
+        self.read_battery()
+        if self._profiler is not None:
+            print(self._profiler.report(self._policy.percent))
+        if self._heap is not None:
+            print(self._heap.report())
         self.wake_up_devices()
 
+    def _failed(self, message, x, failure_retries):
+        """
+        Shows the cached quotes marked as offline, or the error message if there
+        is nothing cached, then waits for the next attempt.
+        @return the remaining retries
+        """
+        cached = self.show_cached(stale=True)
+        if not cached:
+            self._showing_quote = False
+            self._phase("render")
+            self.prepare_screen_layout()
+            self.display_battery()
+            self._display.imagered.text(message, x, 60, 0x00)
+            self._display.display()
+
+        if failure_retries > 0:
+            failure_retries -= 1
+            print(f"Remaining retries {failure_retries}")
+            self._wait(for_failure=True)
+        elif cached:
+            # There's still something useful on screen, keep trying at the normal pace
+            self._wait(for_failure=False)
+        else:
+            self.die()
+        return failure_retries
+
     def run(self):
+        """ The cycle of _cycles() with blocking waits, for a firmware without uasyncio """
+        for step in self._cycles():
+            # With wait_refresh display() returns at the end of the refresh,
+            # the panel is already idle at the waits for it
+            if step is not None:
+                utime.sleep_ms(step)
+
+    async def run_async(self):
+        """
+        The cycle of _cycles() on uasyncio. The panel refreshes without
+        blocking the cycle: the WiFi connects during the refresh of the cached
+        quote or of the "Connecting..." screen, and it's shut down, after the
+        daily NTP sync, during the refresh of the new quote.
+        The HTTP requests and the NTP sync are still blocking.
+        """
+        self._display.wait_refresh = False
+        for step in self._cycles():
+            if step is None:
+                await self._display.ReadBusyAsync()
+            else:
+                await asyncio.sleep_ms(step)
+
+    def _cycles(self):
+        """
+        The cycles of the device, as a generator that yields how many ms to
+        wait, or None to wait for the end of the refresh of the panel.
+        run() and run_async() carry out the waits.
+        """
         self.init_devices()
+        self.setup_network()
+        from internet_getter import InternetGetter, RequestException
 
         failure_retries = self.MAX_RETRIES
         while True:
-            print("Preparing screen")
-            self.prepare_screen_layout()
-            self.display_battery()
-            self._display.imageblack.text("Connecting...", 80, 60, 0x00)
-            self._display.display()
+            if self.status_screens():
+                print("Preparing screen")
+                yield None
+                self._phase("render")
+                self.prepare_screen_layout()
+                self.display_battery()
+                self._display.imageblack.text("Connecting...", 80, 60, 0x00)
+                self._display.display()
 
             print("Connecting")
-            if not self._connection.connect():
+            self._phase("wifi")
+            self.blink_led(True)
+            connected = yield from self._connection.connect_steps()
+            self.blink_led(False)
+            if not connected:
                 print("Connection error")
+                yield None
+                failure_retries = self._failed("Connection error", 62, failure_retries)
+                continue
 
+            print("Connected")
+            # While the panel is still busy this screen would only delay the quote
+            if self.status_screens() and not self._display.busy():
+                self._phase("render")
                 self.prepare_screen_layout()
                 self.display_battery()
-                self._display.imagered.text("Connection error", 62, 60, 0x00)
+                self._display.imageblack.text("Fetching data", 76, 60, 0x00)
                 self._display.display()
-
-                if failure_retries > 0:
-                    failure_retries -= 1
-                    print(f"Remaining retries {failure_retries}")
-                    self._wait(for_failure=True)
-                    continue
-                else:
-                    self.die()
-
-            print("Connected")
-            self.prepare_screen_layout()
-            self.display_battery()
-            self._display.imageblack.text("Fetching data", 76, 60, 0x00)
-            self._display.display()
+            self._phase("fetch")
+            InternetGetter.http.reset_stats()
             try:
-                # price, change, change_percent, date = InternetGetter.get_stock_price(self.STOCK_SYMBOL)
-                price, change, change_percent, date = InternetGetter.get_terminal_stock_price(self.STOCK_SYMBOL)
-                current_time = InternetGetter.get_current_time(self.TIMEZONE)
+                symbols = self.displayed_symbols()
+                quotes = self._quotes.get_quotes(symbols)
+                # Once the clock is set, the sync can wait for the refresh
+                current_time = self.lookup_time(sync=not self._clock.synced())
             except RequestException as e:
                 print(f"API Error: {e}")
+                yield None
+                failure_retries = self._failed("API error", 95, failure_retries)
+                continue
 
-                self.prepare_screen_layout()
-                self.display_battery()
-                self._display.imagered.text("API error", 95, 60, 0x00)
-                self._display.display()
-
-                if failure_retries > 0:
-                    failure_retries -= 1
-                    self._wait(for_failure=True)
-                    continue
-                else:
-                    self.die()
+            print(f"HTTP: {InternetGetter.http.summary()}")
 
             # No failures, restore the original value in case it has been decremented
             failure_retries = self.MAX_RETRIES
 
-            self.prepare_screen_layout()
-            self.display_battery()
-            if (change_percent < 0):
-                fb = self._display.imagered
-            else:
-                fb = self._display.imageblack
-            self._display.imageblack.text(f"{self.STOCK_NAME}", 80, 15, 0x00)
-            self._display.imageblack.hline(15, 25, 220, 0x00)
-            fb.text(f"Price  {price:.2f}$", 10, 30, 0x00)
-            fb.text(f"Change {change:.2f}$ {change_percent:.2f}%", 10, 40, 0x00)
-            fb.text(f"Date   {date}", 10, 50, 0x00)
-            self._display.imageblack.text("Last lookup", 10, 70, 0x00)
-            self._display.imageblack.text(f"{current_time[:10]}", 10, 80, 0x00)
-            self._display.imageblack.text(f"{current_time[11:]}", 10, 90, 0x00)
-            self._display.display()
+            self.store_quotes(symbols, quotes, current_time)
+            yield None
+            self.show_cached(stale=False)
+            self._page += 1
+
+            # The panel is refreshing, finish with the network meanwhile
+            if self._clock.sync_due():
+                self._clock.sync()
+            InternetGetter.http.close()
+            self._connection.disconnect()
+            yield None
 
             self._wait(for_failure=False)
 
+def start():
+    """ Runs the device, the main.py written by tools/build_mpy.py calls it """
+    device = entry_point()
+    print("Starting")
+    if device.USE_ASYNCIO and asyncio is not None:
+        asyncio.run(device.run_async())
+    else:
+        device.run()
+
 
 if __name__ == "__main__":
-    entry_point = entry_point()
-    print("Starting")
-    entry_point.run()
+    start()
@@ -0,0 +1,80 @@
+from local_clock import days_from_civil, civil_from_days, weekday, utc_offset_min
+
+
+# NYSE/NASDAQ full day closures
+US_HOLIDAYS = (
+    "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19",
+    "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+    "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18",
+    "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
+)
+
+
+class MarketSchedule:
+    """
+    Computes when the next refresh is useful given the trading session of an exchange.
+    While the market is open the quote is refreshed every refresh_ms, or every
+    fast_refresh_ms in the fast_window_min minutes after the open and before the
+    close. One last refresh happens after_close_min minutes after the close, to
+    get the closing price, then the device sleeps until the next open.
+    All the times are seconds since 1970-01-01 UTC, as LocalClock.utc_seconds().
+    """
+    def __init__(self, refresh_ms, timezone="America/New_York", open_min=9 * 60 + 30, close_min=16 * 60,
+                 holidays=US_HOLIDAYS, fast_refresh_ms=None, fast_window_min=30, after_close_min=20):
+        self.refresh_ms = refresh_ms
+        self.timezone = timezone
+        self.open_min = open_min
+        self.close_min = close_min
+        self.fast_refresh_ms = fast_refresh_ms
+        self.fast_window_min = fast_window_min
+        self.after_close_min = after_close_min
+        self._holidays = set(days_from_civil(int(h[0:4]), int(h[5:7]), int(h[8:10])) for h in holidays)
+
+    def is_trading_day(self, day):
+        """ @param day: days since 1970 in the exchange timezone """
+        return weekday(day) < 5 and day not in self._holidays
+
+    def _local(self, utc_s):
+        return utc_s + utc_offset_min(self.timezone, utc_s) * 60
+
+    def _to_utc(self, local_s):
+        # The offset at the target can differ from the current one across a DST change
+        return local_s - utc_offset_min(self.timezone, local_s - utc_offset_min(self.timezone, local_s) * 60) * 60
+
+    def is_open(self, utc_s) -> bool:
+        local = self._local(utc_s)
+        minute = local % 86400 // 60
+        return self.is_trading_day(local // 86400) and self.open_min <= minute < self.close_min
+
+    def next_open(self, utc_s):
+        """ @return the UTC seconds of the next session open after utc_s """
+        local = self._local(utc_s)
+        day = local // 86400
+        if local % 86400 >= self.open_min * 60:
+            day += 1
+        while not self.is_trading_day(day):
+            day += 1
+        return self._to_utc(day * 86400 + self.open_min * 60)
+
+    def next_wake_ms(self, utc_s):
+        """ @return how long to sleep, in ms, before the next useful refresh """
+        local = self._local(utc_s)
+        day = local // 86400
+        minute = local % 86400 // 60
+        if self.is_trading_day(day):
+            last_refresh = self._to_utc(day * 86400 + (self.close_min + self.after_close_min) * 60)
+            if self.open_min <= minute < self.close_min:
+                interval = self.refresh_ms
+                if self.fast_refresh_ms is not None and \
+                        (minute < self.open_min + self.fast_window_min or
+                         minute >= self.close_min - self.fast_window_min):
+                    interval = self.fast_refresh_ms
+                # Don't skip the refresh after the close
+                return min(interval, max((last_refresh - utc_s) * 1000, 1000))
+            if self.close_min <= minute and utc_s < last_refresh:
+                return (last_refresh - utc_s) * 1000
+        return max((self.next_open(utc_s) - utc_s) * 1000, 1000)
+
+    def describe(self, utc_s):
+        y, m, d = civil_from_days(self._local(utc_s) // 86400)
+        return f"{y:04d}-{m:02d}-{d:02d} market {'open' if self.is_open(utc_s) else 'closed'}"
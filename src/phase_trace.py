@@ -0,0 +1,161 @@
+"""
+Timestamps of the phases of a cycle, kept in a ring of fixed size slots in
+a file, so that they survive without the USB serial.
+
+begin() starts a cycle, mark() records an event with ticks_us() since the
+beginning and end() writes the cycle in the next slot. Nothing is recorded
+until start() is called. mark() doesn't allocate.
+Read the file with read() or export(), or copy it to the computer and use
+tools/trace_stats.py. The times wrap after about 9 minutes awake, as
+ticks_us() on the Pico. mark() can be called from both cores.
+"""
+import os
+import struct
+import utime
+
+try:
+    import _thread
+    _lock = _thread.allocate_lock()
+except ImportError:
+    _lock = None
+
+EVENTS = ("wake", "wifi", "wifi_fast", "wifi_scan", "wifi_join", "wifi_up", "wifi_fail",
+          "fetch", "http_get", "http_response", "time", "render",
+          "epd_spi", "epd_busy", "epd_ready", "sleep")
+_EVENT_IDS = dict((name, i) for i, name in enumerate(EVENTS))
+
+MAGIC = b"PTRC"
+# magic, slot size, number of slots
+_FILE_HEADER = "<4sHH"
+_FILE_HEADER_SIZE = 8
+# cycle number (0 is an empty slot), RTC seconds, number of events
+_SLOT_HEADER = "<IIH"
+_SLOT_HEADER_SIZE = 10
+# event id, argument, us since the beginning of the cycle
+_EVENT = "<BBI"
+_EVENT_SIZE = 6
+MAX_EVENTS = 41
+SLOT_SIZE = _SLOT_HEADER_SIZE + MAX_EVENTS * _EVENT_SIZE
+
+_path = None
+_slots = 0
+_cycle = 0
+_slot = bytearray(SLOT_SIZE)
+_count = 0
+_start_us = 0
+_active = False
+
+
+def start(path="phase_trace.bin", slots=64):
+    """ Enables the trace, the cycles go in a ring of slots in path """
+    global _path, _slots, _cycle
+    _path = path
+    _slots = slots
+    _cycle = 0
+    try:
+        with open(path, "rb") as f:
+            if f.read(_FILE_HEADER_SIZE) == struct.pack(_FILE_HEADER, MAGIC, SLOT_SIZE, slots):
+                # Only the cycle numbers, the events aren't decoded
+                header = bytearray(_SLOT_HEADER_SIZE)
+                for i in range(slots):
+                    f.seek(_FILE_HEADER_SIZE + i * SLOT_SIZE)
+                    if f.readinto(header) < _SLOT_HEADER_SIZE:
+                        break
+                    _cycle = max(_cycle, struct.unpack_from(_SLOT_HEADER, header, 0)[0])
+                return
+        # Written with another layout, start over
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def begin():
+    global _count, _start_us, _active
+    if _path is None:
+        return
+    _count = 0
+    _start_us = utime.ticks_us()
+    _active = True
+
+
+def mark(name, arg=0):
+    """ Records the event name, one of EVENTS, with an argument from 0 to 255 """
+    if not _active:
+        return
+    if _lock is None:
+        _append(name, arg)
+    else:
+        with _lock:
+            _append(name, arg)
+
+
+def _append(name, arg):
+    global _count
+    if _count >= MAX_EVENTS:
+        return
+    struct.pack_into(_EVENT, _slot, _SLOT_HEADER_SIZE + _count * _EVENT_SIZE,
+                     _EVENT_IDS[name], arg, utime.ticks_diff(utime.ticks_us(), _start_us))
+    _count += 1
+
+
+def end():
+    """ Writes the cycle in the file """
+    global _cycle, _active
+    if not _active:
+        return
+    _active = False
+    _cycle += 1
+    struct.pack_into(_SLOT_HEADER, _slot, 0, _cycle, utime.time(), _count)
+    try:
+        try:
+            f = open(_path, "r+b")
+        except OSError:
+            f = _create()
+        with f:
+            f.seek(_FILE_HEADER_SIZE + (_cycle - 1) % _slots * SLOT_SIZE)
+            f.write(_slot)
+    except OSError as e:
+        print(f"phase_trace: cannot write {_path}: {e}")
+
+
+def _create():
+    f = open(_path, "w+b")
+    f.write(struct.pack(_FILE_HEADER, MAGIC, SLOT_SIZE, _slots))
+    empty = bytearray(SLOT_SIZE)
+    for _ in range(_slots):
+        f.write(empty)
+    return f
+
+
+def read(path="phase_trace.bin"):
+    """ @return the list of (cycle, RTC seconds, [(event, argument, us)]) in the file, oldest first """
+    cycles = []
+    try:
+        with open(path, "rb") as f:
+            magic, slot_size, slots = struct.unpack(_FILE_HEADER, f.read(_FILE_HEADER_SIZE))
+            if magic != MAGIC:
+                return cycles
+            for _ in range(slots):
+                slot = f.read(slot_size)
+                if len(slot) < _SLOT_HEADER_SIZE:
+                    break
+                cycle, rtc, count = struct.unpack_from(_SLOT_HEADER, slot, 0)
+                if cycle == 0:
+                    continue
+                events = []
+                for i in range(min(count, (slot_size - _SLOT_HEADER_SIZE) // _EVENT_SIZE)):
+                    event, arg, us = struct.unpack_from(_EVENT, slot, _SLOT_HEADER_SIZE + i * _EVENT_SIZE)
+                    events.append((EVENTS[event] if event < len(EVENTS) else str(event), arg, us))
+                cycles.append((cycle, rtc, events))
+    except OSError:
+        pass
+    cycles.sort(key=lambda c: c[0])
+    return cycles
+
+
+def export(path="phase_trace.bin"):
+    """ Prints the file as CSV, to copy it from the REPL """
+    print("cycle,rtc,event,arg,us")
+    for cycle, rtc, events in read(path):
+        for event, arg, us in events:
+            print(f"{cycle},{rtc},{event},{arg},{us}")
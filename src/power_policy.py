@@ -0,0 +1,77 @@
+class PowerLevel:
+    """
+    What a cycle is allowed to do at a given state of charge.
+    @param min_percent: the level applies from this charge up
+    @param refresh_factor: the refresh intervals are multiplied by it
+    @param status_screens: show the "Connecting..." and "Fetching data" screens
+    @param fallback: ask the fallback quote provider when the primary fails
+    @param fast_retry: retry after REFRESH_MS_WHEN_FAILED instead of at the next refresh
+    """
+    def __init__(self, name, min_percent, refresh_factor, status_screens, fallback, fast_retry):
+        self.name = name
+        self.min_percent = min_percent
+        self.refresh_factor = refresh_factor
+        self.status_screens = status_screens
+        self.fallback = fallback
+        self.fast_retry = fast_retry
+
+
+# From the highest charge to the lowest
+POWER_LEVELS = (
+    PowerLevel("normal", 50, 1, True, True, True),
+    PowerLevel("saver", 30, 2, False, True, True),
+    PowerLevel("low", 15, 4, False, False, False),
+    PowerLevel("critical", 0, 8, False, False, False),
+)
+
+
+def charge_percent(voltage):
+    """ @return the state of charge of the Li-ion cell from its voltage """
+    percent = (voltage - 3) / 1.2 * 100
+    if percent < 0:
+        return 0
+    if percent > 100:
+        return 100
+    return percent
+
+
+class PowerPolicy:
+    """
+    Chooses the PowerLevel from a smoothed battery voltage. The voltage is an
+    exponential moving average of one reading per cycle, so the load of a
+    single cycle doesn't move the level. A level is left for a higher one only
+    when the charge is hysteresis percent above its threshold.
+    While the battery is charging the first level is used.
+    """
+    def __init__(self, levels=POWER_LEVELS, smoothing=0.3, hysteresis=3):
+        self.levels = levels
+        self.smoothing = smoothing
+        self.hysteresis = hysteresis
+        self.voltage = None
+        self.percent = None
+        self.charging = False
+        self.level = levels[0]
+
+    def update(self, bus_voltage, current_ma):
+        """ @return the level for this cycle """
+        if self.voltage is None:
+            self.voltage = bus_voltage
+        else:
+            self.voltage += self.smoothing * (bus_voltage - self.voltage)
+        self.percent = charge_percent(self.voltage)
+        self.charging = current_ma > 0
+
+        previous = self.level
+        if self.charging:
+            self.level = self.levels[0]
+        else:
+            for level in self.levels:
+                threshold = level.min_percent
+                if self.levels.index(level) < self.levels.index(previous):
+                    threshold += self.hysteresis
+                if self.percent >= threshold:
+                    self.level = level
+                    break
+        if self.level is not previous:
+            print(f"PowerPolicy: {previous.name} -> {self.level.name} at {self.percent:.1f}%")
+        return self.level
@@ -0,0 +1,82 @@
+from array import array
+
+
+class PriceHistory:
+    """
+    The last size quotes of a symbol, in a ring of preallocated arrays so that
+    the memory doesn't grow however long the device runs. Every entry is the
+    price, the change percent of its day and the RTC seconds of the lookup.
+    """
+    def __init__(self, size=96):
+        self.size = size
+        self._prices = array("f", (0 for _ in range(size)))
+        self._changes = array("f", (0 for _ in range(size)))
+        self._times = array("L", (0 for _ in range(size)))
+        self._scratch = array("f", (0, 0))
+        self._next = 0
+        self.count = 0
+
+    def add(self, timestamp, price, change_percent):
+        """ Records a quote, it's ignored when the price and change didn't move since the last one """
+        if self.count:
+            last = (self._next - 1) % self.size
+            # Compared as stored, after the rounding to single precision
+            self._scratch[0] = price
+            self._scratch[1] = change_percent
+            if self._scratch[0] == self._prices[last] and self._scratch[1] == self._changes[last]:
+                return False
+        self._prices[self._next] = price
+        self._changes[self._next] = change_percent
+        self._times[self._next] = timestamp
+        self._next = (self._next + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        return True
+
+    def _index(self, i):
+        """ @return the array index of the i-th entry, oldest first """
+        return (self._next - self.count + i) % self.size
+
+    def get(self, i):
+        """ @return (timestamp, price, change_percent) of the i-th entry, oldest first """
+        j = self._index(i)
+        return self._times[j], self._prices[j], self._changes[j]
+
+    def range(self, since=0):
+        """ @return (first entry, lowest price, highest price) of the entries not older than since """
+        first = 0
+        while first < self.count and self._times[self._index(first)] < since:
+            first += 1
+        low = high = None
+        for i in range(first, self.count):
+            price = self._prices[self._index(i)]
+            if low is None or price < low:
+                low = price
+            if high is None or price > high:
+                high = price
+        return first, low, high
+
+    def draw(self, black, red, x, y, w, h, since=0):
+        """
+        Draws the entries not older than since as a line auto-scaled in the
+        (x, y, w, h) area, the segments ending on a down day in red.
+        @return False if there are less than two entries to draw
+        """
+        first, low, high = self.range(since)
+        points = self.count - first
+        if points < 2:
+            return False
+        span = high - low
+        prev_x = prev_y = 0
+        for i in range(points):
+            j = self._index(first + i)
+            px = x + i * (w - 1) // (points - 1)
+            if span > 0:
+                py = y + h - 1 - int((self._prices[j] - low) * (h - 1) / span)
+            else:
+                py = y + h // 2
+            if i:
+                fb = red if self._changes[j] < 0 else black
+                fb.line(prev_x, prev_y, px, py, 0x00)
+            prev_x, prev_y = px, py
+        return True
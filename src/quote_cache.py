@@ -0,0 +1,53 @@
+import json
+import os
+
+
+class QuoteCache:
+    """
+    Last good quote of every symbol, saved on flash so that it survives resets.
+    The quotes are (price, change, change_percent, date) tuples, each one is
+    kept with the time of its fetch as shown on the display.
+    """
+    def __init__(self, path):
+        self._path = path
+        # symbol: [price, change, change_percent, date, lookup time]
+        self._quotes = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+            quotes = data["quotes"]
+            if any(len(quote) != 5 for quote in quotes.values()):
+                raise ValueError("unexpected quote record")
+            self._quotes = quotes
+        except (OSError, ValueError, KeyError) as e:
+            # First boot or corrupted file, start empty
+            print(f"QuoteCache: nothing loaded from {self._path}: {e}")
+
+    def save(self):
+        # Write a new file and swap it, a reset while writing leaves the old one intact
+        tmp = self._path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"quotes": self._quotes}, f)
+        os.rename(tmp, self._path)
+
+    def get(self, symbol):
+        """ @return the cached (price, change, change_percent, date) or None """
+        quote = self._quotes.get(symbol)
+        return tuple(quote[:4]) if quote is not None else None
+
+    def lookup_time(self, symbol):
+        """ @return the time of the fetch of the cached quote of symbol, or None """
+        quote = self._quotes.get(symbol)
+        return quote[4] if quote is not None else None
+
+    def update(self, symbols, quotes, lookup_time):
+        for symbol, quote in zip(symbols, quotes):
+            self._quotes[symbol] = list(quote) + [lookup_time]
+        try:
+            self.save()
+        except OSError as e:
+            # The values are still cached in RAM
+            print(f"QuoteCache: cannot save {self._path}: {e}")
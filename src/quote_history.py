@@ -0,0 +1,191 @@
+"""
+History of the quotes of a symbol in a file of fixed size records, written
+as a ring: when the file is full the oldest records are overwritten.
+
+The records are kept in RAM and appended in batches, so that the flash is
+written once every batch quotes instead of at every lookup. flush() writes
+them right away. The ring is never loaded in RAM: last() and since() read
+it a block of records at a time, since() finds its first record with an
+index of the timestamp of every block, kept in RAM.
+The timestamps are UTC seconds since 1970 and must not go back in time.
+"""
+import struct
+from array import array
+
+MAGIC = b"QHST"
+# magic, record size, records per block, capacity, next record, records in the file
+_HEADER = "<4sHHIII"
+_HEADER_SIZE = 20
+# UTC seconds, price, change, change percent
+_RECORD = "<Ifff"
+RECORD_SIZE = 16
+BLOCK_RECORDS = 16
+
+
+class QuoteHistory:
+    """
+    @param capacity: records in the file, rounded up to a multiple of BLOCK_RECORDS
+    @param batch: records kept in RAM before writing them
+    """
+    def __init__(self, path, capacity=1024, batch=8):
+        self._path = path
+        self.capacity = (capacity + BLOCK_RECORDS - 1) // BLOCK_RECORDS * BLOCK_RECORDS
+        self.batch = batch
+        self._head = 0
+        self._count = 0
+        self._pending = bytearray(batch * RECORD_SIZE)
+        self._pending_count = 0
+        self._last_time = 0
+        self._block = bytearray(BLOCK_RECORDS * RECORD_SIZE)
+        # Timestamp of the first record of every block
+        self._index = array("L", (0 for _ in range(self.capacity // BLOCK_RECORDS)))
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, "rb") as f:
+                magic, record_size, block, capacity, head, count = struct.unpack(_HEADER, f.read(_HEADER_SIZE))
+                if magic != MAGIC or record_size != RECORD_SIZE or block != BLOCK_RECORDS or \
+                        capacity != self.capacity or head >= capacity or count > capacity:
+                    print(f"QuoteHistory: {self._path} has another layout, starting over")
+                    return
+                self._head = head
+                self._count = count
+                for b in range(len(self._index)):
+                    if self._occupied(b * BLOCK_RECORDS):
+                        f.seek(_HEADER_SIZE + b * BLOCK_RECORDS * RECORD_SIZE)
+                        self._index[b] = struct.unpack("<I", f.read(4))[0]
+        except (OSError, ValueError) as e:
+            # First boot or truncated file, start empty
+            print(f"QuoteHistory: nothing loaded from {self._path}: {e}")
+            self._head = 0
+            self._count = 0
+            return
+        if self._count:
+            self._last_time = self._read_time(self._count - 1)
+
+    def _occupied(self, slot):
+        """ @return True if the record slot holds one of the records in the file """
+        return (slot - self._head) % self.capacity >= self.capacity - self._count
+
+    def _slot(self, i):
+        """ @return the record slot of the i-th record in the file, oldest first """
+        return (self._head - self._count + i) % self.capacity
+
+    def __len__(self):
+        return self._count + self._pending_count
+
+    def append(self, timestamp, price, change, change_percent):
+        """ @return False if the record is older than the last one and was dropped """
+        if timestamp < self._last_time:
+            print(f"QuoteHistory: {timestamp} is before the last record, dropped")
+            return False
+        struct.pack_into(_RECORD, self._pending, self._pending_count * RECORD_SIZE,
+                         timestamp, price, change, change_percent)
+        self._pending_count += 1
+        self._last_time = timestamp
+        if self._pending_count >= self.batch:
+            self.flush()
+        return True
+
+    def flush(self):
+        """ Writes the records kept in RAM """
+        if not self._pending_count:
+            return
+        try:
+            try:
+                f = open(self._path, "r+b")
+            except OSError:
+                f = open(self._path, "w+b")
+                self._head = 0
+                self._count = 0
+            with f:
+                mv = memoryview(self._pending)
+                written = 0
+                while written < self._pending_count:
+                    # Up to the end of the file, then from the beginning
+                    n = min(self._pending_count - written, self.capacity - self._head)
+                    f.seek(_HEADER_SIZE + self._head * RECORD_SIZE)
+                    f.write(mv[written * RECORD_SIZE:(written + n) * RECORD_SIZE])
+                    for i in range(n):
+                        slot = self._head + i
+                        if slot % BLOCK_RECORDS == 0:
+                            self._index[slot // BLOCK_RECORDS] = struct.unpack_from(
+                                "<I", self._pending, (written + i) * RECORD_SIZE)[0]
+                    written += n
+                    self._head = (self._head + n) % self.capacity
+                    self._count = min(self._count + n, self.capacity)
+                # The header last, a reset before it loses only this batch
+                f.seek(0)
+                f.write(struct.pack(_HEADER, MAGIC, RECORD_SIZE, BLOCK_RECORDS,
+                                    self.capacity, self._head, self._count))
+        except OSError as e:
+            # The records stay in RAM, the next flush tries again
+            print(f"QuoteHistory: cannot write {self._path}: {e}")
+            return
+        self._pending_count = 0
+
+    def _read_time(self, i):
+        with open(self._path, "rb") as f:
+            f.seek(_HEADER_SIZE + self._slot(i) * RECORD_SIZE)
+            return struct.unpack("<I", f.read(4))[0]
+
+    def records(self, first=0):
+        """ Yields the (timestamp, price, change, change_percent) from the first-th one, oldest first """
+        i = max(first, 0)
+        if i < self._count:
+            with open(self._path, "rb") as f:
+                while i < self._count:
+                    # A block at most, without crossing the end of the file
+                    slot = self._slot(i)
+                    n = min(BLOCK_RECORDS, self._count - i, self.capacity - slot)
+                    f.seek(_HEADER_SIZE + slot * RECORD_SIZE)
+                    f.readinto(memoryview(self._block)[:n * RECORD_SIZE])
+                    for k in range(n):
+                        yield struct.unpack_from(_RECORD, self._block, k * RECORD_SIZE)
+                    i += n
+        for k in range(i - self._count, self._pending_count):
+            yield struct.unpack_from(_RECORD, self._pending, k * RECORD_SIZE)
+
+    def last(self, n):
+        """ Yields the last n records, oldest first """
+        return self.records(len(self) - n)
+
+    def since(self, timestamp):
+        """ Yields the records not older than timestamp, oldest first """
+        return self.records(self._find(timestamp))
+
+    def _find(self, timestamp):
+        """ @return the number of the first record not older than timestamp """
+        # The block starts in the order of the records, the first one is
+        # the first block start after the oldest record
+        oldest = self._slot(0)
+        offset = (BLOCK_RECORDS - oldest % BLOCK_RECORDS) % BLOCK_RECORDS
+        blocks = 0 if offset >= self._count else (self._count - offset + BLOCK_RECORDS - 1) // BLOCK_RECORDS
+        lo, hi = 0, blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            slot = (oldest + offset + mid * BLOCK_RECORDS) % self.capacity
+            if self._index[slot // BLOCK_RECORDS] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        # The first record not older is after the previous block start, if any
+        first = 0 if lo == 0 else offset + (lo - 1) * BLOCK_RECORDS
+        i = first
+        records = self.records(first)
+        try:
+            for record in records:
+                if record[0] >= timestamp:
+                    break
+                i += 1
+        finally:
+            # Closes the file now rather than when the generator is collected
+            records.close()
+        return i
+
+    def export(self):
+        """ Prints the records as CSV, to copy them from the REPL """
+        print("time,price,change,change_percent")
+        for timestamp, price, change, change_percent in self.records():
+            print(f"{timestamp},{price:.2f},{change:.2f},{change_percent:.2f}")
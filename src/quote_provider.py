@@ -0,0 +1,128 @@
+import utime
+
+from internet_getter import InternetGetter, RequestException
+
+
+PROVIDERS = {}
+
+
+def register_provider(cls):
+    """ Class decorator that makes a QuoteProvider available by its name """
+    PROVIDERS[cls.name] = cls
+    return cls
+
+
+class QuoteProvider:
+    """
+    Common interface of the quote sources, every provider defines
+    get_quotes(symbols, deadline=None, answer_deadline=None) that returns a
+    list of (price, change, change_percent, date), in the same order of
+    symbols, or raises RequestException.
+    The deadlines are utime.ticks_ms() values, see InternetGetter._get().
+    answer_deadline bounds the wait for the first answer of the provider.
+    """
+    name = ""
+
+
+@register_provider
+class TerminalStocksProvider(QuoteProvider):
+    name = "terminal-stocks"
+
+    def get_quotes(self, symbols, deadline=None, answer_deadline=None):
+        return InternetGetter.get_terminal_stock_prices(symbols, deadline, answer_deadline)
+
+
+@register_provider
+class AlphaVantageProvider(QuoteProvider):
+    name = "alphavantage"
+
+    def get_quotes(self, symbols, deadline=None, answer_deadline=None):
+        return InternetGetter.get_stock_prices(symbols, deadline, answer_deadline)
+
+
+class CircuitBreaker:
+    """
+    Stops using a provider after max_failures consecutive failures.
+    After cooldown_ms a single attempt is allowed again, another failure
+    opens the circuit for a new cooldown.
+    """
+    def __init__(self, max_failures, cooldown_ms):
+        self.max_failures = max_failures
+        self.cooldown_ms = cooldown_ms
+        self.failures = 0
+        self._opened_at = None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if utime.ticks_diff(utime.ticks_ms(), self._opened_at) >= self.cooldown_ms:
+            # Half open, the next result decides
+            self._opened_at = None
+            self.failures = self.max_failures - 1
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self._opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self._opened_at = utime.ticks_ms()
+
+
+class QuoteService:
+    """
+    Gets the quotes from a primary provider, using the fallback one when
+    the primary fails, doesn't start answering within hedge_ms, or has been
+    failing too often.
+    The whole lookup never takes more than deadline_ms.
+    """
+    def __init__(self, primary, fallback=None, deadline_ms=20_000, hedge_ms=5_000,
+                 max_failures=3, cooldown_ms=2 * 60 * 60 * 1000):
+        self._providers = [provider for provider in (primary, fallback) if provider is not None]
+        self._breakers = {}
+        for provider in self._providers:
+            self._breakers[provider.name] = CircuitBreaker(max_failures, cooldown_ms)
+        self.deadline_ms = deadline_ms
+        self.hedge_ms = hedge_ms
+        # When False only the first available provider is asked
+        self.use_fallback = True
+        # Name of the provider that answered the last lookup
+        self.last_provider = None
+
+    def breaker(self, name):
+        return self._breakers[name]
+
+    def get_quotes(self, symbols):
+        start = utime.ticks_ms()
+        deadline = utime.ticks_add(start, self.deadline_ms)
+        available = [provider for provider in self._providers if self._breakers[provider.name].allow()]
+        if not available:
+            raise RequestException("All quote providers are disabled")
+        if not self.use_fallback:
+            available = available[:1]
+
+        errors = []
+        for i, provider in enumerate(available):
+            # The MicroPython requests are blocking, so the primary can't be left
+            # running: when there's another provider it must start answering
+            # within hedge_ms, otherwise the request moves on to the next one.
+            answer_deadline = None
+            if i < len(available) - 1:
+                answer_deadline = utime.ticks_add(start, self.hedge_ms)
+            try:
+                quotes = provider.get_quotes(symbols, deadline, answer_deadline)
+            except RequestException as e:
+                print(f"QuoteService: {provider.name} failed: {e}")
+                self._breakers[provider.name].failure()
+                errors.append(f"{provider.name}: {e}")
+                continue
+
+            self._breakers[provider.name].success()
+            self.last_provider = provider.name
+            print(f"QuoteService: quotes from {provider.name} in {utime.ticks_diff(utime.ticks_ms(), start)} ms")
+            return quotes
+
+        raise RequestException("; ".join(errors))
@@ -0,0 +1,72 @@
+"""
+Host benchmark for the landscape e-paper transfer.
+
+It compares the original byte-by-byte display() loop with the bulk
+send_plane() path and checks that the panel receives the same bytes.
+
+Usage: python3 tools/bench_epd_transfer.py
+"""
+import random
+import sys
+import time
+
+import simulator
+
+
+def legacy_display(epd):
+    """The display() implementation before the bulk transfer, minus the refresh"""
+    epd.send_command(0x24)
+    for j in range(int(epd.width / 8) - 1, -1, -1):
+        for i in range(0, epd.height):
+            epd.send_data(epd.buffer_balck[i + j * epd.height])
+
+    epd.send_command(0x26)
+    for j in range(int(epd.width / 8) - 1, -1, -1):
+        for i in range(0, epd.height):
+            epd.send_data(epd.buffer_red[i + j * epd.height])
+
+
+def bulk_display(epd):
+    epd.send_command(0x24)
+    epd.send_plane(epd.buffer_balck)
+
+    epd.send_command(0x26)
+    epd.send_plane(epd.buffer_red)
+
+
+def measure(epd, func, rounds):
+    epd.spi.writes = 0
+    epd.spi.stream = bytearray()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(epd)
+    elapsed = (time.perf_counter() - start) / rounds
+    return elapsed, epd.spi.writes // rounds, bytes(epd.spi.stream[:len(epd.spi.stream) // rounds])
+
+
+def main():
+    simulator.install()
+    import epaper2in13b
+
+    epd = epaper2in13b.EPD_2in13_B_V4_Landscape()
+    rnd = random.Random(0)
+    epd.buffer_balck[:] = bytes(rnd.getrandbits(8) for _ in range(len(epd.buffer_balck)))
+    epd.buffer_red[:] = bytes(rnd.getrandbits(8) for _ in range(len(epd.buffer_red)))
+
+    rounds = 5
+    legacy_t, legacy_writes, legacy_bytes = measure(epd, legacy_display, rounds)
+    bulk_t, bulk_writes, bulk_bytes = measure(epd, bulk_display, rounds)
+
+    print(f"legacy: {legacy_t * 1000:8.2f} ms  {legacy_writes:6d} spi.write calls")
+    print(f"bulk:   {bulk_t * 1000:8.2f} ms  {bulk_writes:6d} spi.write calls")
+    print(f"speedup: {legacy_t / bulk_t:.1f}x")
+
+    if legacy_bytes != bulk_bytes:
+        print("MISMATCH: the two paths sent different bytes")
+        return 1
+    print(f"OK: {len(bulk_bytes)} identical bytes sent")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Compiles the modules in src to MicroPython bytecode with mpy-cross, so
+that the Pico loads .mpy files instead of compiling every module from
+source at every boot.
+
+MicroPython runs main.py only from source, so main.py is compiled as
+stock_display.mpy and a main.py of two lines that starts it is written
+instead. secrets.py is copied as it is, to be edited on the Pico.
+Copy everything in the output directory to the Pico, and delete the .py
+files of the previous install: a .py file is imported before the .mpy
+one. The "Boot:" line printed at the first frame shows the time saved.
+
+The bytecode version must be the one of the firmware. mpy-cross comes with
+the MicroPython sources or `pip install mpy-cross`, see `mpy-cross --version`.
+
+Usage: python3 tools/build_mpy.py [--out build] [--mpy-cross mpy-cross]
+       [--march armv6m]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+SRC_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+# Module name of main.py once compiled
+APP_MODULE = "stock_display"
+# Kept as source
+SOURCE_FILES = ("secrets.py",)
+
+MAIN_PY = f"""# Written by tools/build_mpy.py, the application is {APP_MODULE}.mpy
+import {APP_MODULE}
+{APP_MODULE}.start()
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="build", help="output directory, emptied first")
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="mpy-cross command")
+    parser.add_argument("--march", default="armv6m", help="architecture of the native code, armv6m on the RP2040")
+    args = parser.parse_args()
+
+    if shutil.which(args.mpy_cross) is None:
+        print(f"{args.mpy_cross} not found, install it with `pip install mpy-cross` or pass --mpy-cross")
+        return 1
+    out = os.path.abspath(args.out)
+    shutil.rmtree(out, ignore_errors=True)
+    os.makedirs(out)
+
+    print(f"{'file':<28} {'source':>8} {'output':>8}")
+    total_src = total_out = 0
+    for name in sorted(os.listdir(SRC_DIR)):
+        if not name.endswith(".py"):
+            continue
+        src = os.path.join(SRC_DIR, name)
+        if name in SOURCE_FILES:
+            target = os.path.join(out, name)
+            shutil.copyfile(src, target)
+        else:
+            module = APP_MODULE if name == "main.py" else name[:-3]
+            target = os.path.join(out, module + ".mpy")
+            # -s keeps the file name of the module in the tracebacks
+            result = subprocess.run([args.mpy_cross, f"-march={args.march}", "-s", module + ".py",
+                                     "-o", target, src], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{name}: mpy-cross failed\n{result.stderr}")
+                return 1
+        src_size = os.path.getsize(src)
+        out_size = os.path.getsize(target)
+        total_src += src_size
+        total_out += out_size
+        print(f"{name:<28} {src_size:8d} {out_size:8d}  {os.path.basename(target)}")
+
+    with open(os.path.join(out, "main.py"), "w") as f:
+        f.write(MAIN_PY)
+    print(f"{'total':<28} {total_src:8d} {total_out:8d}")
+    if not os.path.exists(os.path.join(SRC_DIR, "secrets.py")):
+        print("WARNING: src/secrets.py is missing, create it from secrets.py.example and copy it to the Pico")
+    print(f"Copy the content of {out} to the Pico")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
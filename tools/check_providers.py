@@ -0,0 +1,109 @@
+"""
+Runs the quote providers against local stub servers and checks the
+connection reuse and the deadline, fallback and circuit breaker
+behaviour of QuoteService.
+
+Usage: python3 tools/check_providers.py
+"""
+import sys
+import time
+
+import simulator
+import stub_quote_server
+
+
+def main():
+    simulator.install()
+    from internet_getter import InternetGetter, RequestException
+    from quote_provider import PROVIDERS, QuoteService
+
+    primary = stub_quote_server.start()
+    fallback = stub_quote_server.start()
+    InternetGetter.TERMINAL_STOCKS_URL = primary.base_url
+    InternetGetter.ALPHAVANTAGE_URL = fallback.base_url
+
+    service = QuoteService(PROVIDERS["terminal-stocks"](), PROVIDERS["alphavantage"](),
+                           deadline_ms=3000, hedge_ms=500, max_failures=2, cooldown_ms=1000)
+    failures = []
+
+    def check(label, condition):
+        print(f"{'OK  ' if condition else 'FAIL'} {label}")
+        if not condition:
+            failures.append(label)
+
+    def lookup(symbols):
+        start = time.monotonic()
+        try:
+            quotes = service.get_quotes(symbols)
+        except RequestException as e:
+            print(f"     error: {e}")
+            quotes = None
+        return quotes, (time.monotonic() - start) * 1000
+
+    quotes, ms = lookup(["ARM", "AAPL"])
+    check(f"batched lookup from the primary ({ms:.0f} ms)",
+          quotes is not None and len(quotes) == 2 and service.last_provider == "terminal-stocks"
+          and primary.requests == 1)
+
+    InternetGetter.http.close()
+    InternetGetter.http.reset_stats()
+    for _ in range(3):
+        InternetGetter.get_stock_prices(["ARM", "AAPL"])
+    print(f"     {InternetGetter.http.summary()}")
+    check("keep-alive connection reused across requests",
+          InternetGetter.http.requests == 6 and InternetGetter.http.connections == 1)
+
+    primary.delay_s = 2.0
+    quotes, ms = lookup(["ARM"])
+    check(f"slow primary hedged to the fallback ({ms:.0f} ms)",
+          quotes is not None and service.last_provider == "alphavantage" and ms < 2000)
+
+    primary.delay_s = 0
+    primary.status = 500
+    lookup(["ARM"])
+    check("circuit opens after repeated failures", not service.breaker("terminal-stocks").allow())
+    before = primary.requests
+    quotes, ms = lookup(["ARM"])
+    check("open circuit skips the primary",
+          quotes is not None and primary.requests == before and service.last_provider == "alphavantage")
+
+    primary.status = 200
+    time.sleep(1.1)
+    quotes, ms = lookup(["ARM"])
+    check("primary used again after the cooldown", quotes is not None and service.last_provider == "terminal-stocks")
+
+    # Alpha Vantage makes one request per symbol, the hedge bounds only the first answer
+    av_first = QuoteService(PROVIDERS["alphavantage"](), PROVIDERS["terminal-stocks"](),
+                            deadline_ms=3000, hedge_ms=500)
+    fallback.delay_s = 0.35
+    start = time.monotonic()
+    try:
+        quotes = av_first.get_quotes(["ARM", "AAPL"])
+    except RequestException as e:
+        print(f"     error: {e}")
+        quotes = None
+    ms = (time.monotonic() - start) * 1000
+    check(f"sequential requests of the primary not cut by the hedge ({ms:.0f} ms)",
+          quotes is not None and len(quotes) == 2 and av_first.last_provider == "alphavantage")
+
+    fallback.delay_s = 0
+    try:
+        InternetGetter.get_stock_prices(["XXXX"])
+        error = None
+    except RequestException as e:
+        error = str(e)
+    print(f"     error: {error}")
+    check("unknown symbol is an error answer of Alpha Vantage",
+          error is not None and "Request failed" not in error)
+
+    primary.delay_s = 5.0
+    fallback.delay_s = 5.0
+    quotes, ms = lookup(["ARM"])
+    check(f"deadline bounds the lookup when both are slow ({ms:.0f} ms)", quotes is None and ms < 3500)
+
+    print("All checks passed" if not failures else f"{len(failures)} checks failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Runs main.py unchanged on the host simulator, against a local stub
+server. Every frame sent to the panel is saved as a PNG image in the
+output directory, where main.py also keeps its cache files, and the
+time, SPI traffic and charge of every cycle are printed at the end.
+
+Usage: python3 tools/simulate_device.py [--cycles 3] [--out sim-out]
+       [--start 2026-10-19T14:00] [--delay 0] [--status 200]
+       [--battery 80] [--no-ups] [--no-wifi] [--sync]
+"""
+import argparse
+import datetime
+import os
+import sys
+
+import simulator
+import stub_quote_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=3, help="stop at the beginning of this sleep")
+    parser.add_argument("--out", default="sim-out", help="directory of the frames and the cache files")
+    parser.add_argument("--start", help="UTC date and time of the simulated world, default now")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each stub answer")
+    parser.add_argument("--status", type=int, default=200, help="HTTP status of every stub answer")
+    parser.add_argument("--walk", type=float, default=0.0, help="random price move per stub answer, e.g. 0.01")
+    parser.add_argument("--battery", type=float, default=80, help="initial charge of the battery in percent")
+    parser.add_argument("--no-ups", action="store_true", help="simulate a board without the UPS")
+    parser.add_argument("--no-wifi", action="store_true", help="no access point in range")
+    parser.add_argument("--sync", action="store_true", help="use run() instead of run_async()")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    os.makedirs(out, exist_ok=True)
+    wall_start = None
+    if args.start:
+        wall_start = datetime.datetime.fromisoformat(args.start).replace(tzinfo=datetime.timezone.utc).timestamp()
+    sim = simulator.Board(wall_start=wall_start,
+                          battery=None if args.no_ups else simulator.Battery(charge_percent=args.battery),
+                          access_points=[] if args.no_wifi else None,
+                          frames_dir=out, stop_after=args.cycles)
+    simulator.install(sim)
+
+    server = stub_quote_server.start(delay_s=args.delay, status=args.status, walk=args.walk)
+    from internet_getter import InternetGetter
+    InternetGetter.TERMINAL_STOCKS_URL = server.base_url
+    InternetGetter.ALPHAVANTAGE_URL = server.base_url
+    InternetGetter.TIMEAPI_URL = server.base_url
+
+    # main.py writes its cache files in the current directory
+    os.chdir(out)
+    import main as device_main
+    import uasyncio
+    try:
+        device = device_main.entry_point()
+        if args.sync or not device.USE_ASYNCIO:
+            device.run()
+        else:
+            uasyncio.run(device.run_async())
+    except simulator.SimulationStop:
+        pass
+
+    print()
+    print("cycle  total s  awake s  busy s  wifi s  SPI bytes  SPI ms  refreshes      mAh")
+    for i, cycle in enumerate(sim.cycles):
+        print(f"{i + 1:5d} {cycle.total_ms / 1000:8.1f} {cycle.awake_ms() / 1000:8.1f} "
+              f"{cycle.busy_ms / 1000:7.1f} {cycle.wifi_ms / 1000:7.1f} {cycle.spi_bytes:10d} "
+              f"{cycle.spi_ms:7.1f} {cycle.refreshes:10d} {cycle.mah:8.3f}")
+    print(f"{sim.panel.frames} frames saved in {out}, {server.requests} HTTP requests")
+    if sim.battery is not None:
+        print(f"battery: {sim.battery.voltage():.3f} V, {sim.battery.used_mah:.1f} of {sim.battery.capacity_mah} mAh used")
+    if sim.panel.ignored_bytes:
+        print(f"WARNING: {sim.panel.ignored_bytes} bytes sent while the panel was in deep sleep")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
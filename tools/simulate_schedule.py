@@ -0,0 +1,57 @@
+"""
+Simulates the refreshes of a week with the market aware schedule and
+compares them with a fixed refresh interval.
+
+Usage: python3 tools/simulate_schedule.py [--start 2026-10-19] [--weeks 1] [--refresh-min 30] [--fast-min 10]
+"""
+import argparse
+import datetime
+import sys
+
+import simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", default="2026-10-19", help="first day, UTC midnight")
+    parser.add_argument("--weeks", type=int, default=1)
+    parser.add_argument("--refresh-min", type=int, default=30, help="entry_point.REFRESH_MS in minutes")
+    parser.add_argument("--fast-min", type=int, default=None,
+                        help="refresh interval near open and close, in minutes")
+    args = parser.parse_args()
+
+    simulator.install()
+    from market_schedule import MarketSchedule
+
+    refresh_ms = args.refresh_min * 60 * 1000
+    fast_ms = args.fast_min * 60 * 1000 if args.fast_min else None
+    schedule = MarketSchedule(refresh_ms, fast_refresh_ms=fast_ms)
+
+    start = int(datetime.datetime.fromisoformat(args.start).replace(tzinfo=datetime.timezone.utc).timestamp())
+    end = start + args.weeks * 7 * 86400
+
+    wakes = 0
+    wakes_open = 0
+    t = start
+    while t < end:
+        wakes += 1
+        wakes_open += schedule.is_open(t)
+        t += schedule.next_wake_ms(t) // 1000
+
+    fixed = 0
+    fixed_open = 0
+    t = start
+    while t < end:
+        fixed += 1
+        fixed_open += schedule.is_open(t)
+        t += refresh_ms // 1000
+
+    print(f"{args.weeks} week(s) from {args.start}")
+    print(f"fixed {refresh_ms // 60000} min interval: {fixed:4d} wake-ups, {fixed_open:4d} while the market is open")
+    print(f"market aware schedule:   {wakes:4d} wake-ups, {wakes_open:4d} while the market is open")
+    print(f"saved {fixed - wakes} wake-ups ({(fixed - wakes) * 100 / fixed:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Host simulator of the device: stand-ins for the MicroPython modules used
+by the project (machine, network, framebuf, utime, uasyncio, _thread and
+ntptime) backed by a simulated Pico W with the UPS and the e-paper panel,
+so that the modules in src run unchanged on CPython.
+
+    import simulator
+    board = simulator.install()
+    import main
+
+The sockets are the ones of the host, point InternetGetter at the stub
+servers of stub_quote_server.py.
+"""
+import binascii
+import os
+import sys
+import types
+
+from .board import Battery, Board, SimulationStop
+from .ina219_device import INA219Device
+from .panel import Panel
+
+SRC_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+
+UPS_ADDRESS = 0x43
+
+
+def install(sim=None):
+    """
+    Registers the simulated modules and puts src on the import path.
+    Without a board, one with the UPS, the panel and every network of the
+    secrets in range is created.
+    @return the Board
+    """
+    from . import _thread, board, framebuf, machine, network, ntptime, uasyncio, utime
+
+    if sim is None:
+        sim = Board(battery=Battery())
+    if sim.panel is None:
+        sim.panel = Panel()
+    if sim.battery is not None and UPS_ADDRESS not in sim.i2c_devices:
+        sim.i2c_devices[UPS_ADDRESS] = INA219Device()
+    board.current = sim
+
+    sys.modules["machine"] = machine
+    sys.modules["network"] = network
+    sys.modules["framebuf"] = framebuf
+    sys.modules["utime"] = utime
+    sys.modules["ntptime"] = ntptime
+    sys.modules["uasyncio"] = uasyncio
+    sys.modules["_thread"] = _thread
+
+    # The stdlib has a secrets module too, use the project one if present
+    sys.modules.pop("secrets", None)
+    if not os.path.exists(os.path.join(SRC_DIR, "secrets.py")):
+        project_secrets = types.ModuleType("secrets")
+        project_secrets.WIFI_CREDENTIALS = [("simulator", "simulator")]
+        project_secrets.ALPHAVANTAGE_API_KEY = "demo"
+        sys.modules["secrets"] = project_secrets
+
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+    if sim.access_points is None:
+        import secrets
+        sim.access_points = []
+        for i, (ssid, password) in enumerate(secrets.WIFI_CREDENTIALS):
+            bssid = binascii.unhexlify(f"02000000000{i:01x}")
+            sim.access_points.append((ssid, password, bssid, 6, -50 - i))
+    return sim
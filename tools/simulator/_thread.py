@@ -0,0 +1,45 @@
+"""
+Simulated _thread module. The RP2040 runs one thread on core 1: it's a
+host thread that follows the board clock, see board.py.
+"""
+import sys
+import threading
+import traceback
+
+from . import board
+
+LockType = type(threading.Lock())
+
+
+def allocate_lock():
+    return threading.Lock()
+
+
+def get_ident():
+    return threading.get_ident()
+
+
+def exit():
+    raise SystemExit()
+
+
+def start_new_thread(function, args, kwargs=None):
+    sim = board.current
+    if sim.core1 is not None:
+        raise OSError(16, "core 1 in use")
+
+    def run():
+        try:
+            function(*args, **(kwargs or {}))
+        except SystemExit:
+            pass
+        except BaseException:
+            print("Unhandled exception in thread started by", function, file=sys.stderr)
+            traceback.print_exc()
+        finally:
+            sim.core1_exit()
+
+    thread = threading.Thread(target=run, daemon=True)
+    sim.core1 = thread
+    thread.start()
+    return thread.ident
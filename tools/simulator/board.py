@@ -0,0 +1,305 @@
+"""
+State of the simulated Pico W: the clock, the pins, the timers, the WiFi
+chip, the I2C devices and the e-paper panel, plus the accounting of time
+and charge per cycle.
+
+The clock is the real elapsed time plus everything the code spends in
+sleep_ms(), lightsleep() and SPI transfers, which is added without waiting.
+Only core 0, the main thread, moves it forward: a thread started on core 1
+with _thread sleeps until core 0 gets to its wake up time.
+"""
+import threading
+import time
+
+# Set by simulator.install(), the modules find the board here
+current = None
+
+# RTC value of a Pico W after power on
+RTC_POWER_ON = 1609459200  # 2021-01-01T00:00:00Z
+# Longest time between two slices of a sleep, see Board.lightsleep()
+SLICE_GAP_MS = 5
+
+
+class SimulationStop(BaseException):
+    """ Raised from lightsleep() when the requested number of cycles is done """
+
+
+class Battery:
+    """ A Li-ion cell with a linear discharge from full_v to empty_v """
+    def __init__(self, capacity_mah=1000, charge_percent=80, full_v=4.2, empty_v=3.0):
+        self.capacity_mah = capacity_mah
+        self.used_mah = capacity_mah * (100 - charge_percent) / 100
+        self.full_v = full_v
+        self.empty_v = empty_v
+
+    def voltage(self):
+        left = max(0.0, 1 - self.used_mah / self.capacity_mah)
+        return self.empty_v + (self.full_v - self.empty_v) * left
+
+
+class CycleStats:
+    """ What happened between two wake ups """
+    def __init__(self):
+        self.total_ms = 0
+        self.sleep_ms = 0
+        self.busy_ms = 0
+        self.wifi_ms = 0
+        self.spi_bytes = 0
+        self.spi_ms = 0
+        self.refreshes = 0
+        self.mah = 0.0
+
+    def awake_ms(self):
+        return self.total_ms - self.sleep_ms
+
+    def add(self, other):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+class Board:
+    """
+    @param wall_start: UTC seconds of the real world at the start, default now
+    @param battery: a Battery, or None to simulate a board without the UPS
+    @param access_points: list of (ssid, password, bssid, channel, rssi), by default
+           every network of secrets.WIFI_CREDENTIALS is in range
+    @param frames_dir: directory where the panel writes every refreshed frame as PNG
+    @param stop_after: raise SimulationStop after this many cycles
+    """
+    SPI_BAUDRATE = 4_000_000
+    # Consumption of the parts, in mA
+    AWAKE_MA = 25.0
+    LIGHTSLEEP_MA = 1.5
+    WIFI_MA = 45.0
+    PANEL_REFRESH_MA = 5.0
+
+    def __init__(self, wall_start=None, battery=None, access_points=None, frames_dir=None, stop_after=None):
+        self.wall_start = time.time() if wall_start is None else wall_start
+        self.rtc_base = RTC_POWER_ON
+        self.battery = battery
+        self.access_points = access_points
+        self.frames_dir = frames_dir
+        self.stop_after = stop_after
+
+        self._real_start = time.monotonic()
+        self._real_accounted = 0.0
+        self._offset_ms = 0.0
+        self.sleeping = False
+
+        self.pins = {}
+        self.timers = []
+        self.i2c_devices = {}
+        self.wifi = None
+        self.panel = None
+
+        self.cycle = CycleStats()
+        self.cycles = []
+        # Clock value at the end of the last sleep that ended a cycle
+        self._sleep_end = None
+
+        # The thread running on core 1, and the clock value at which its
+        # sleep ends while it's sleeping
+        self.core1 = None
+        self._core1_wake = None
+        self.lock = threading.RLock()
+        self._core1_cond = threading.Condition(self.lock)
+
+    # Clock
+
+    def now_ms(self):
+        """ @return the clock, the real time elapsed since the last call is charged at the current consumption """
+        with self.lock:
+            real = time.monotonic() - self._real_start
+            if real > self._real_accounted:
+                elapsed_ms = (real - self._real_accounted) * 1000
+                self._real_accounted = real
+                self._account(elapsed_ms)
+            return self.clock_ms()
+
+    def clock_ms(self):
+        """ @return the clock as of the last now_ms() or advance() """
+        return self._real_accounted * 1000 + self._offset_ms
+
+    def advance(self, ms):
+        """ Moves the clock forward without waiting, core 1 runs when its sleep ends """
+        if ms <= 0 or self.on_core1():
+            # Core 1 runs alongside core 0, that keeps the time
+            return
+        with self.lock:
+            # Core 1 runs in real time, the clock waits for its next sleep
+            self._wait_core1()
+            end = self.now_ms() + ms
+            while self._core1_wake is not None and self._core1_wake <= end:
+                self._forward(self._core1_wake - self.clock_ms())
+                self._resume_core1()
+            self._forward(end - self.clock_ms())
+
+    def _forward(self, ms):
+        if ms > 0:
+            self._account(ms)
+            self._offset_ms += ms
+
+    # Core 1
+
+    def on_core1(self):
+        return self.core1 is not None and threading.current_thread() is self.core1
+
+    def _resume_core1(self):
+        """ Wakes core 1 up and waits until it sleeps again or ends """
+        self._core1_wake = None
+        self._core1_cond.notify_all()
+        self._wait_core1()
+
+    def _wait_core1(self):
+        """ Waits until core 1 sleeps or ends """
+        # Bounded, in case core 1 waits for something core 0 holds
+        give_up = time.monotonic() + 1.0
+        while self.core1 is not None and self._core1_wake is None and time.monotonic() < give_up:
+            self._core1_cond.wait(0.01)
+
+    def _core1_sleep(self, ms):
+        with self.lock:
+            wake = self.now_ms() + ms
+            self._core1_wake = wake
+            self._core1_cond.notify_all()
+            # Core 0 wakes it up when its clock gets there, the real time counts too
+            while self._core1_wake is not None and self.now_ms() < wake:
+                self._core1_cond.wait(0.001)
+            self._core1_wake = None
+            self._core1_cond.notify_all()
+
+    def core1_exit(self):
+        with self.lock:
+            self.core1 = None
+            self._core1_wake = None
+            self._core1_cond.notify_all()
+
+    def rtc_seconds(self):
+        return self.rtc_base + self.now_ms() / 1000
+
+    def wall_seconds(self):
+        return self.wall_start + self.now_ms() / 1000
+
+    def current_ma(self):
+        ma = self.LIGHTSLEEP_MA if self.sleeping else self.AWAKE_MA
+        if self.wifi is not None and self.wifi.active:
+            ma += self.WIFI_MA
+        if self.panel is not None and self.panel.busy():
+            ma += self.PANEL_REFRESH_MA
+        return ma
+
+    def _account(self, ms):
+        mah = self.current_ma() * ms / 3_600_000
+        self.cycle.total_ms += ms
+        self.cycle.mah += mah
+        if self.wifi is not None and self.wifi.active:
+            self.cycle.wifi_ms += ms
+        if self.battery is not None:
+            self.battery.used_mah += mah
+
+    # Timers and sleep
+
+    def run_timers(self):
+        now = self.now_ms()
+        for timer in list(self.timers):
+            if timer.next_ms <= now:
+                if timer.periodic:
+                    # Soft timers that were late run once
+                    while timer.next_ms <= now:
+                        timer.next_ms += timer.period
+                else:
+                    self.timers.remove(timer)
+                timer.callback(timer)
+
+    def sleep(self, ms):
+        if self.on_core1():
+            self._core1_sleep(ms)
+            return
+        if self.panel is not None and self.panel.busy():
+            self.cycle.busy_ms += ms
+        self.advance(ms)
+        self.run_timers()
+
+    def lightsleep(self, ms):
+        """ Sleeps for ms, or until a pin interrupt, as machine.lightsleep() """
+        if self.core1 is not None:
+            # The clocks of core 1 stop too, it has to be stopped first
+            raise RuntimeError("lightsleep() while core 1 is running")
+        busy_wait = self.panel is not None and self.panel.busy()
+        wake_pin = None
+        if busy_wait:
+            pin = self.pins.get(self.panel.busy_pin)
+            if pin is not None and pin.handler is not None and \
+                    self.panel.busy_until - self.now_ms() <= ms:
+                ms = max(0, self.panel.busy_until - self.now_ms())
+                wake_pin = pin
+
+        # Long sleeps are split in slices under the limit of lightsleep(),
+        # a slice that follows another one without any work belongs to its cycle
+        continued = not busy_wait and self._sleep_end is not None and \
+            self.now_ms() - self._sleep_end < SLICE_GAP_MS
+        self.sleeping = True
+        self.advance(ms)
+        self.sleeping = False
+        if busy_wait:
+            self.cycle.busy_ms += ms
+        else:
+            self.cycle.sleep_ms += ms
+        if wake_pin is not None:
+            wake_pin.handler(wake_pin.owner)
+        self.run_timers()
+
+        if not busy_wait:
+            # A sleep that isn't waiting for the panel ends the cycle
+            self._sleep_end = self.now_ms()
+            if continued:
+                self.cycles[-1].add(self.cycle)
+                self.cycle = CycleStats()
+                return
+            self.cycles.append(self.cycle)
+            self.cycle = CycleStats()
+            if self.stop_after is not None and len(self.cycles) >= self.stop_after:
+                raise SimulationStop()
+
+    def idle(self):
+        """ Waits for the next interrupt, at most 1 ms """
+        busy = self.panel is not None and self.panel.busy()
+        self.sleep(1)
+        if busy:
+            pin = self.pins.get(self.panel.busy_pin)
+            if not self.panel.busy() and pin is not None and pin.handler is not None:
+                pin.handler(pin.owner)
+
+    # Pins
+
+    def pin(self, pin_id):
+        if pin_id not in self.pins:
+            self.pins[pin_id] = PinState()
+        return self.pins[pin_id]
+
+    def pin_value(self, pin_id):
+        if self.panel is not None and pin_id == self.panel.busy_pin:
+            return 1 if self.panel.busy() else 0
+        return self.pin(pin_id).value
+
+    def pin_changed(self, pin_id, value):
+        if self.panel is not None:
+            self.panel.pin_changed(pin_id, value)
+
+    # SPI
+
+    def spi_write(self, buf):
+        with self.lock:
+            ms = len(buf) * 8 * 1000 / self.SPI_BAUDRATE
+            self.cycle.spi_bytes += len(buf)
+            self.cycle.spi_ms += ms
+            self.advance(ms)
+            if self.panel is not None:
+                self.panel.spi_write(buf, self.pin_value(self.panel.dc_pin), self.pin_value(self.panel.cs_pin))
+
+
+class PinState:
+    def __init__(self):
+        self.value = 0
+        self.handler = None
+        self.owner = None
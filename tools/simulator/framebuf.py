@@ -0,0 +1,121 @@
+"""
+Simulated framebuf module, with the monochrome formats only. The pixels
+are stored in the given buffer with the same layout as MicroPython, so
+the display drivers send the same bytes.
+"""
+from . import font
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS4_HMSB = 2
+GS2_HMSB = 5
+GS8 = 6
+# MicroPython alias of MONO_VLSB
+MVLSB = MONO_VLSB
+
+
+class FrameBuffer:
+    def __init__(self, buf, width, height, buf_format, stride=None):
+        if buf_format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError("only the monochrome formats are simulated")
+        self.buf = buf
+        self.width = width
+        self.height = height
+        self.format = buf_format
+        if stride is None:
+            stride = width
+        if buf_format != MONO_VLSB:
+            stride = (stride + 7) & ~7
+        self.stride = stride
+
+    def _locate(self, x, y):
+        """ @return (byte index, bit mask) of the pixel """
+        if self.format == MONO_VLSB:
+            return (y >> 3) * self.stride + x, 1 << (y & 7)
+        index = (y * self.stride + x) >> 3
+        if self.format == MONO_HLSB:
+            return index, 0x80 >> (x & 7)
+        return index, 1 << (x & 7)
+
+    def _set(self, x, y, c):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            index, mask = self._locate(x, y)
+            if c & 1:
+                self.buf[index] |= mask
+            else:
+                self.buf[index] &= ~mask & 0xFF
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                return None
+            index, mask = self._locate(x, y)
+            return 1 if self.buf[index] & mask else 0
+        self._set(x, y, c)
+
+    def fill(self, c):
+        self.buf[:] = (b"\xff" if c & 1 else b"\x00") * len(self.buf)
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self.height)):
+            for xx in range(max(x, 0), min(x + w, self.width)):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        # Bresenham, including both ends like MicroPython
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for char in s:
+            for col, bits in enumerate(font.glyph(char)):
+                for row in range(8):
+                    if bits >> row & 1:
+                        self._set(x + 1 + col, y + row, c)
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        pixels = [[self.pixel(x, y) for x in range(self.width)] for y in range(self.height)]
+        for y in range(self.height):
+            for x in range(self.width):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < self.width and 0 <= sy < self.height:
+                    self._set(x, y, pixels[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for sy in range(fbuf.height):
+            for sx in range(fbuf.width):
+                c = fbuf.pixel(sx, sy)
+                if c != key:
+                    self._set(x + sx, y + sy, c)
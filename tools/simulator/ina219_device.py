@@ -0,0 +1,79 @@
+"""
+Simulated INA219 of the UPS, measuring the current drawn from the battery
+of the board through a 0.01 ohm shunt.
+"""
+from . import board
+
+_REG_CONFIG = 0x00
+_REG_SHUNTVOLTAGE = 0x01
+_REG_BUSVOLTAGE = 0x02
+_REG_POWER = 0x03
+_REG_CURRENT = 0x04
+_REG_CALIBRATION = 0x05
+
+_CNVR = 0x02
+_CONVERSION_US = (84, 148, 276, 532, 532, 532, 532, 532,
+                  532, 1060, 2130, 4260, 8510, 17020, 34050, 68100)
+
+SHUNT_OHM = 0.01
+
+
+class INA219Device:
+    """
+    Registers and conversions of the sensor. A conversion samples the
+    board consumption when it ends, power down keeps the last results.
+    The current is negative because the battery is discharging.
+    """
+    def __init__(self):
+        self.regs = [0x399F, 0, 0, 0, 0, 0]
+        # When the running conversion ends, None if the ADC is stopped
+        self._conversion_end = None
+        self.conversions = 0
+
+    def _mode(self):
+        return self.regs[_REG_CONFIG] & 0x07
+
+    def _conversion_ms(self):
+        config = self.regs[_REG_CONFIG]
+        return (_CONVERSION_US[config >> 7 & 0x0F] + _CONVERSION_US[config >> 3 & 0x0F]) / 1000
+
+    def _convert(self):
+        sim = board.current
+        current_ma = -sim.current_ma()
+        shunt_mv = current_ma * SHUNT_OHM
+        voltage = sim.battery.voltage() if sim.battery is not None else 5.0
+        self.regs[_REG_SHUNTVOLTAGE] = int(round(shunt_mv / 0.01)) & 0xFFFF
+        self.regs[_REG_BUSVOLTAGE] = int(voltage / 0.004) << 3 | _CNVR
+        # Current_LSB = 0.04096 / (Cal * Rshunt) A
+        calibration = self.regs[_REG_CALIBRATION]
+        if calibration:
+            lsb_ma = 0.04096 / (calibration * SHUNT_OHM) * 1000
+            self.regs[_REG_CURRENT] = int(round(current_ma / lsb_ma)) & 0xFFFF
+            self.regs[_REG_POWER] = int(abs(current_ma) * voltage / (20 * lsb_ma)) & 0xFFFF
+        self.conversions += 1
+
+    def _update(self):
+        now = board.current.now_ms()
+        if self._conversion_end is None or now < self._conversion_end:
+            return
+        self._convert()
+        if self._mode() >= 5:
+            self._conversion_end = now + self._conversion_ms()
+        else:
+            # Triggered conversions happen once
+            self._conversion_end = None
+
+    def read(self, reg, nbytes):
+        self._update()
+        value = self.regs[reg]
+        if reg in (_REG_POWER, _REG_CURRENT):
+            self.regs[_REG_BUSVOLTAGE] &= ~_CNVR
+        return bytes(((value >> 8) & 0xFF, value & 0xFF))[:nbytes]
+
+    def write(self, reg, data):
+        self.regs[reg] = data[0] << 8 | data[1]
+        if reg == _REG_CONFIG:
+            self.regs[_REG_BUSVOLTAGE] &= ~_CNVR
+            self._conversion_end = None
+            if self._mode() not in (0, 4):
+                self._conversion_end = board.current.now_ms() + self._conversion_ms()
@@ -0,0 +1,151 @@
+"""
+Simulated machine module: Pin, SPI, I2C and Timer on the simulated board.
+"""
+import errno
+
+from . import board
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self._id = pin_id
+        self._state = board.current.pin(pin_id)
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return board.current.pin_value(self._id)
+        v = 1 if v else 0
+        if v != self._state.value:
+            self._state.value = v
+            board.current.pin_changed(self._id, v)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - self._state.value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._state.handler = handler
+        self._state.owner = self
+
+
+class SPI:
+    """
+    The bytes written go to the simulated panel. writes counts the write()
+    calls, and every byte is also appended to stream when it's a bytearray.
+    """
+    def __init__(self, spi_id, *args, **kwargs):
+        self.writes = 0
+        self.stream = None
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        self.writes += 1
+        if self.stream is not None:
+            self.stream += buf
+        board.current.spi_write(bytes(buf))
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    def __init__(self, i2c_id, scl=None, sda=None, freq=400_000):
+        pass
+
+    def _device(self, addr):
+        device = board.current.i2c_devices.get(addr)
+        if device is None:
+            raise OSError(errno.EIO)
+        return device
+
+    def scan(self):
+        return sorted(board.current.i2c_devices)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(self._device(addr).read(memaddr, nbytes))
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        data = self._device(addr).read(memaddr, len(buf))
+        buf[:] = data
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._device(addr).write(memaddr, bytes(buf))
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, **kwargs):
+        self.period = 0
+        self.periodic = False
+        self.callback = None
+        self.next_ms = 0
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self.period = period
+        self.periodic = mode == Timer.PERIODIC
+        self.callback = callback
+        self.next_ms = board.current.now_ms() + period
+        board.current.timers.append(self)
+
+    def deinit(self):
+        if self in board.current.timers:
+            board.current.timers.remove(self)
+
+
+# The rp2 port sets the wake-up alarm in microseconds on 32 bits
+MAX_LIGHTSLEEP_US = 2 ** 32
+
+
+def lightsleep(ms=None):
+    if ms is not None and ms * 1000 >= MAX_LIGHTSLEEP_US:
+        raise ValueError("sleep too long")
+    board.current.lightsleep(ms if ms is not None else 24 * 60 * 60 * 1000)
+
+
+def deepsleep(ms=None):
+    # The board restarts from main.py, that's where the simulation ends
+    board.current.lightsleep(ms if ms is not None else 24 * 60 * 60 * 1000)
+    raise board.SimulationStop()
+
+
+def idle():
+    board.current.idle()
+
+
+def freq(hz=None):
+    return 125_000_000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x5a\x2b\x28"
+
+
+def reset():
+    raise board.SimulationStop()
@@ -0,0 +1,111 @@
+"""
+Simulated network module: one CYW43 station interface that joins the
+access points of the board. The sockets are the ones of the host, so the
+HTTP requests reach the stub servers for real.
+"""
+from . import board
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+# Time to join an access point, with and without bssid and channel
+JOIN_MS = 2500
+FAST_JOIN_MS = 800
+DHCP_MS = 500
+SCAN_MS = 1500
+
+LEASE = ("192.168.1.42", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+NO_ADDRESS = ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+
+class _Radio:
+    """ State of the chip, shared by all the WLAN objects like on the device """
+    def __init__(self):
+        self.active = False
+        self.static = None
+        self.ssid = None
+        self.ready_ms = None
+        self.result = STAT_IDLE
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def status(self):
+        if self.ready_ms is None:
+            return self.result
+        if board.current.now_ms() < self.ready_ms:
+            return STAT_CONNECTING
+        return self.result
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        if board.current.wifi is None:
+            board.current.wifi = _Radio()
+        self._radio = board.current.wifi
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._radio.active
+        self._radio.active = bool(is_active)
+        if not is_active:
+            self.disconnect()
+
+    def scan(self):
+        board.current.advance(SCAN_MS)
+        return [(ssid.encode(), bssid, channel, rssi, 3, False)
+                for ssid, password, bssid, channel, rssi in board.current.access_points]
+
+    def connect(self, ssid=None, key=None, bssid=None, channel=None):
+        if not self._radio.active:
+            raise OSError("WLAN not active")
+        radio = self._radio
+        radio.ssid = ssid
+        now = board.current.now_ms()
+        radio.result = STAT_NO_AP_FOUND
+        radio.ready_ms = now + JOIN_MS
+        for ap_ssid, ap_password, ap_bssid, ap_channel, rssi in board.current.access_points:
+            if ap_ssid != ssid or (bssid is not None and bssid != ap_bssid):
+                continue
+            if key != ap_password:
+                radio.result = STAT_WRONG_PASSWORD
+                break
+            radio.result = STAT_GOT_IP
+            fast = bssid is not None and channel == ap_channel
+            radio.ready_ms = now + (FAST_JOIN_MS if fast else JOIN_MS) + (0 if radio.static else DHCP_MS)
+            break
+
+    def disconnect(self):
+        self._radio.ssid = None
+        self._radio.ready_ms = None
+        self._radio.result = STAT_IDLE
+
+    def deinit(self):
+        self.active(False)
+
+    def isconnected(self):
+        return self._radio.isconnected()
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        return self._radio.status()
+
+    def ifconfig(self, config=None):
+        if config is None:
+            if not self._radio.isconnected():
+                return NO_ADDRESS
+            return self._radio.static or LEASE
+        self._radio.static = None if config == "dhcp" else tuple(config)
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        return None
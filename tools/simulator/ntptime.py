@@ -0,0 +1,22 @@
+"""
+Simulated ntptime module, settime() sets the RTC to the simulated wall clock.
+"""
+import errno
+
+from . import board
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time():
+    wifi = board.current.wifi
+    if wifi is None or not wifi.isconnected():
+        raise OSError(errno.ETIMEDOUT)
+    board.current.advance(30)
+    return int(board.current.wall_seconds())
+
+
+def settime():
+    wall = time()
+    board.current.rtc_base += wall - board.current.rtc_seconds()
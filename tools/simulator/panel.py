@@ -0,0 +1,176 @@
+"""
+Simulated SSD1680 controller of the 2.13" B V4 panel. It decodes the SPI
+byte stream into the black and red RAM, keeps BUSY high while a refresh
+or a reset is running, and saves every refreshed frame as a PNG image.
+"""
+import os
+import struct
+import zlib
+
+from . import board
+
+# Panel RAM, in bytes of 8 sources by gates
+RAM_COLUMNS = 16
+RAM_ROWS = 250
+
+REFRESH_MS = 15_000
+SWRESET_MS = 10
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (200, 0, 0)
+
+
+def write_png(path, width, height, pixels, palette):
+    """ Writes an 8 bit palette PNG, pixels is a bytes object of palette indices """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    raw = b"".join(b"\x00" + pixels[y * width:(y + 1) * width] for y in range(height))
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)))
+        f.write(chunk(b"PLTE", b"".join(bytes(color) for color in palette)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        f.write(chunk(b"IEND", b""))
+
+
+class Panel:
+    """
+    @param landscape: the frames are saved rotated like the landscape driver draws them
+    """
+    def __init__(self, rst_pin=12, dc_pin=8, cs_pin=9, busy_pin=13, landscape=True):
+        self.rst_pin = rst_pin
+        self.dc_pin = dc_pin
+        self.cs_pin = cs_pin
+        self.busy_pin = busy_pin
+        self.landscape = landscape
+
+        self.ram = {0x24: bytearray(b"\xff" * (RAM_COLUMNS * RAM_ROWS)),
+                    0x26: bytearray(b"\xff" * (RAM_COLUMNS * RAM_ROWS))}
+        self.busy_until = 0
+        self.asleep = False
+        self.frames = 0
+        self.ignored_bytes = 0
+        self._reset_registers()
+
+    def _reset_registers(self):
+        self._command = None
+        self._args = []
+        self._entry_mode = 0x03
+        self._x0, self._x1 = 0, RAM_COLUMNS - 1
+        self._y0, self._y1 = 0, RAM_ROWS - 1
+        self._x, self._y = 0, 0
+
+    def busy(self):
+        return board.current.clock_ms() < self.busy_until
+
+    def _busy_for(self, ms):
+        self.busy_until = board.current.now_ms() + ms
+
+    def pin_changed(self, pin_id, value):
+        if pin_id == self.rst_pin and value == 0:
+            # Hardware reset, it also wakes the controller up
+            self.asleep = False
+            self._reset_registers()
+
+    def spi_write(self, data, dc, cs):
+        if cs:
+            return
+        if self.asleep:
+            self.ignored_bytes += len(data)
+            return
+        if dc == 0:
+            for command in data:
+                self._start(command)
+        elif self._command in self.ram:
+            self._write_ram(self.ram[self._command], data)
+        else:
+            for value in data:
+                self._argument(value)
+
+    def _start(self, command):
+        self._command = command
+        self._args = []
+        if command == 0x12:  # SWRESET
+            self._reset_registers()
+            self._busy_for(SWRESET_MS)
+        elif command == 0x20:  # Master activation
+            self._busy_for(REFRESH_MS)
+            self.frames += 1
+            board.current.cycle.refreshes += 1
+            if board.current.frames_dir is not None:
+                self.save(os.path.join(board.current.frames_dir, f"frame_{self.frames:04d}.png"))
+
+    def _argument(self, value):
+        self._args.append(value)
+        args = self._args
+        command = self._command
+        if command == 0x11 and len(args) == 1:
+            self._entry_mode = value
+        elif command == 0x44 and len(args) == 2:
+            self._x0, self._x1 = args
+        elif command == 0x45 and len(args) == 4:
+            self._y0 = args[0] | args[1] << 8
+            self._y1 = args[2] | args[3] << 8
+        elif command == 0x4E and len(args) == 1:
+            self._x = value
+        elif command == 0x4F and len(args) == 2:
+            self._y = args[0] | args[1] << 8
+        elif command == 0x10 and len(args) == 1 and value & 0x03:
+            self.asleep = True
+
+    def _write_ram(self, ram, data):
+        y_first = self._entry_mode & 0x04
+        x_step = 1 if self._entry_mode & 0x01 else -1
+        y_step = 1 if self._entry_mode & 0x02 else -1
+        x, y = self._x, self._y
+        for value in data:
+            if 0 <= x < RAM_COLUMNS and 0 <= y < RAM_ROWS:
+                ram[x * RAM_ROWS + y] = value
+            if y_first:
+                y, x = self._step(y, y_step, self._y0, self._y1, x, x_step, self._x0, self._x1)
+            else:
+                x, y = self._step(x, x_step, self._x0, self._x1, y, y_step, self._y0, self._y1)
+        self._x, self._y = x, y
+
+    @staticmethod
+    def _step(a, a_step, a0, a1, b, b_step, b0, b1):
+        """ Moves the counter a inside the window, carrying to b at the end of the row """
+        a += a_step
+        if a_step > 0 and a > a1 or a_step < 0 and a < a0:
+            a = a0 if a_step > 0 else a1
+            b += b_step
+            if b_step > 0 and b > b1 or b_step < 0 and b < b0:
+                b = b0 if b_step > 0 else b1
+        return a, b
+
+    def pixels(self):
+        """ @return (width, height, palette indices) of the image in RAM, 0 white, 1 black, 2 red """
+        black = self.ram[0x24]
+        red = self.ram[0x26]
+        sources = RAM_COLUMNS * 8
+        if self.landscape:
+            width, height = RAM_ROWS, sources
+        else:
+            width, height = sources, RAM_ROWS
+        out = bytearray(width * height)
+        for gate in range(RAM_ROWS):
+            for source in range(sources):
+                index = (source >> 3) * RAM_ROWS + gate
+                mask = 0x80 >> (source & 7)
+                if not red[index] & mask:
+                    color = 2
+                elif not black[index] & mask:
+                    color = 1
+                else:
+                    continue
+                if self.landscape:
+                    out[(sources - 1 - source) * width + gate] = color
+                else:
+                    out[gate * width + source] = color
+        return width, height, bytes(out)
+
+    def save(self, path):
+        width, height, pixels = self.pixels()
+        write_png(path, width, height, pixels, (WHITE, BLACK, RED))
@@ -0,0 +1,140 @@
+"""
+Simulated uasyncio module: the subset used by the project (run,
+create_task, gather, sleep, sleep_ms) on a scheduler that follows the board
+clock, so the sleeps of the tasks don't take real time. When every task is
+sleeping the clock moves to the first wake up, as the idle loop of uasyncio.
+"""
+import heapq
+
+from . import board
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class _Sleep:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __await__(self):
+        yield self
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiting = []
+
+    def __await__(self):
+        if not self.done:
+            yield self
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def cancel(self):
+        if not self.done:
+            _loop.throw(self, CancelledError())
+
+
+class _Loop:
+    def __init__(self):
+        self.ready = []
+        self.sleeping = []
+        self._order = 0
+        self.main = None
+
+    def schedule(self, task, value=None, error=None):
+        self.ready.append((task, value, error))
+
+    def sleep(self, task, ms):
+        self._order += 1
+        heapq.heappush(self.sleeping, (board.current.now_ms() + ms, self._order, task))
+
+    def throw(self, task, error):
+        self.sleeping = [entry for entry in self.sleeping if entry[2] is not task]
+        heapq.heapify(self.sleeping)
+        self.schedule(task, error=error)
+
+    def step(self, task, value, error):
+        try:
+            if error is not None:
+                awaited = task.coro.throw(error)
+            else:
+                awaited = task.coro.send(value)
+        except StopIteration as e:
+            self.finish(task, e.value, None)
+            return
+        except BaseException as e:
+            self.finish(task, None, e)
+            return
+        if isinstance(awaited, _Sleep):
+            self.sleep(task, awaited.ms)
+        elif isinstance(awaited, Task):
+            awaited.waiting.append(task)
+        else:
+            raise RuntimeError(f"cannot await {awaited!r} in the simulator")
+
+    def finish(self, task, result, error):
+        task.done = True
+        task.result = result
+        task.error = error
+        for waiting in task.waiting:
+            self.schedule(waiting)
+        if error is not None and not task.waiting and task is not self.main and \
+                not isinstance(error, CancelledError):
+            # Like uasyncio, an exception nobody waits for is printed
+            if isinstance(error, Exception):
+                print(f"Task exception wasn't retrieved: {error!r}")
+            else:
+                raise error
+
+    def run_until(self, main):
+        self.main = main
+        while not main.done:
+            if self.ready:
+                task, value, error = self.ready.pop(0)
+                self.step(task, value, error)
+                continue
+            if not self.sleeping:
+                raise RuntimeError("every task is waiting, nothing can wake them up")
+            wake_ms, _, task = heapq.heappop(self.sleeping)
+            delay = wake_ms - board.current.now_ms()
+            if delay > 0:
+                board.current.sleep(delay)
+            self.schedule(task)
+        if main.error is not None:
+            raise main.error
+        return main.result
+
+
+_loop = _Loop()
+
+
+def create_task(coro):
+    task = Task(coro)
+    _loop.schedule(task)
+    return task
+
+
+def run(coro):
+    global _loop
+    _loop = _Loop()
+    return _loop.run_until(create_task(coro))
+
+
+async def gather(*aws):
+    tasks = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    return [await task for task in tasks]
+
+
+def sleep_ms(ms):
+    return _Sleep(ms)
+
+
+def sleep(seconds):
+    return _Sleep(seconds * 1000)
@@ -0,0 +1,56 @@
+"""
+Simulated utime module on the board clock. time() and gmtime() follow the
+RTC, that starts at 2021-01-01 like on the Pico W until ntptime sets it.
+"""
+import time as _time
+
+from . import board
+
+
+def ticks_ms():
+    return int(board.current.now_ms())
+
+
+def ticks_us():
+    return int(board.current.now_ms() * 1000)
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(ticks1, ticks2):
+    return ticks1 - ticks2
+
+
+def sleep_ms(ms):
+    board.current.sleep(ms)
+
+
+def sleep_us(us):
+    board.current.sleep(us / 1000)
+
+
+def sleep(seconds):
+    board.current.sleep(seconds * 1000)
+
+
+def time():
+    return int(board.current.rtc_seconds())
+
+
+def time_ns():
+    return int(board.current.rtc_seconds() * 1_000_000_000)
+
+
+def gmtime(secs=None):
+    if secs is None:
+        secs = time()
+    return tuple(_time.gmtime(secs))[:8]
+
+
+localtime = gmtime
@@ -0,0 +1,163 @@
+"""
+Local HTTP server that imitates terminal-stocks.dev, Alpha Vantage and
+timeapi.io, with configurable latency and failures.
+
+Point InternetGetter.TERMINAL_STOCKS_URL, ALPHAVANTAGE_URL and TIMEAPI_URL
+at base_url to use it.
+
+Usage: python3 tools/stub_quote_server.py [--port 8080] [--delay 0] [--status 200] [--walk 0]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# symbol -> (name, price, change, change percent)
+DEFAULT_QUOTES = {
+    "ARM": ("Arm Holdings plc", 131.27, -2.15, -1.61),
+    "AAPL": ("Apple Inc.", 189.84, 1.02, 0.54),
+    "NVDA": ("NVIDIA Corporation", 875.28, 12.40, 1.44),
+}
+
+
+def terminal_stocks_body(quotes, symbols):
+    lines = ["",
+             "┌────────────────────┬───────────────┬──────────┬──────────┐",
+             "│ Stock              │ Current Price │ Change   │ % Change │",
+             "├────────────────────┼───────────────┼──────────┼──────────┤"]
+    for symbol in symbols:
+        name, price, change, percent = quotes[symbol]
+        sign = "-" if change < 0 else ""
+        lines.append(f"│ {name:<18} │ ${price:<12.2f} │ {sign}${abs(change):<7.2f} │ {percent:<7.2f}% │")
+    lines.append("└────────────────────┴───────────────┴──────────┴──────────┘")
+    lines.append(f"Last updated at {datetime.utcnow().strftime('%b %d, %Y, %H:%M:%S')} UTC")
+    return "\n".join(lines) + "\n"
+
+
+def alphavantage_body(quotes, symbol):
+    name, price, change, percent = quotes[symbol]
+    return json.dumps({"Global Quote": {
+        "01. symbol": symbol,
+        "05. price": f"{price:.4f}",
+        "07. latest trading day": datetime.utcnow().strftime("%Y-%m-%d"),
+        "09. change": f"{change:.4f}",
+        "10. change percent": f"{percent:.4f}%",
+    }}, indent=4)
+
+
+def alphavantage_error_body():
+    # What Alpha Vantage answers, with status 200, for a symbol it doesn't know
+    return json.dumps({"Error Message": "Invalid API call. Please retry or visit the documentation "
+                                        "(https://www.alphavantage.co/documentation/) for GLOBAL_QUOTE."},
+                      indent=4)
+
+
+def walk_quotes(quotes, step):
+    """ Moves every price by a random fraction up to step, keeping the previous close """
+    for symbol, (name, price, change, percent) in quotes.items():
+        close = price - change
+        price = round(price * (1 + random.uniform(-step, step)), 2)
+        quotes[symbol] = (name, price, round(price - close, 2), round((price - close) / close * 100, 2))
+
+
+def timeapi_body():
+    return json.dumps({"dateTime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real servers
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # The client dropped an idle keep-alive connection
+            pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.delay_s)
+        if server.status != 200:
+            self._reply(server.status, "error\n")
+            return
+
+        url = urlparse(self.path)
+        if server.walk and not url.path.startswith("/api/Time"):
+            walk_quotes(server.quotes, server.walk)
+        if url.path == "/query":
+            symbol = parse_qs(url.query).get("symbol", [""])[0]
+            if symbol not in server.quotes:
+                self._reply(200, alphavantage_error_body(), "application/json")
+                return
+            self._reply(200, alphavantage_body(server.quotes, symbol), "application/json")
+        elif url.path.startswith("/api/Time"):
+            self._reply(200, timeapi_body(), "application/json")
+        else:
+            symbols = [s for s in url.path.strip("/").split(",") if s]
+            if not all(s in server.quotes for s in symbols):
+                self._reply(404, "unknown symbol\n")
+                return
+            self._reply(200, terminal_stocks_body(server.quotes, symbols))
+
+    def _reply(self, status, body, content_type="text/plain; charset=utf-8"):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting, that's what the slow modes are for
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start(port=0, delay_s=0.0, status=200, quotes=None, verbose=False, walk=0.0):
+    """
+    Starts a stub server in a background thread.
+    With walk, the prices move randomly by up to that fraction at every quote request.
+    delay_s, status and quotes can be changed on the returned server while it runs.
+    @return the server, its base_url attribute is the URL to use
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.delay_s = delay_s
+    server.status = status
+    server.quotes = dict(quotes or DEFAULT_QUOTES)
+    server.verbose = verbose
+    server.walk = walk
+    server.requests = 0
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each answer")
+    parser.add_argument("--status", type=int, default=200, help="HTTP status of every answer")
+    parser.add_argument("--walk", type=float, default=0.0, help="random price move per request, e.g. 0.01")
+    args = parser.parse_args()
+
+    server = start(args.port, args.delay, args.status, verbose=True, walk=args.walk)
+    print(f"Serving on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Prints the latency percentiles of the phases recorded by phase_trace.py.
+
+The time of an event is the time until the next event of the same cycle,
+summed when the event happens more than once in a cycle. "awake" is the
+time from the wake up to the sleep.
+
+Copy the trace from the board with `mpremote cp :phase_trace.bin .`, or
+save the output of phase_trace.export() in a .csv file.
+
+Usage: python3 tools/trace_stats.py phase_trace.bin [--last 20]
+"""
+import argparse
+import csv
+import math
+import sys
+
+import simulator
+
+
+def load(path):
+    """ @return the list of (cycle, RTC seconds, [(event, argument, us)]) """
+    if path.endswith(".csv"):
+        cycles = {}
+        with open(path) as f:
+            for row in csv.DictReader(f):
+                cycle = cycles.setdefault(int(row["cycle"]), (int(row["cycle"]), int(row["rtc"]), []))
+                cycle[2].append((row["event"], int(row["arg"]), int(row["us"])))
+        return [cycles[key] for key in sorted(cycles)]
+
+    import phase_trace
+    return phase_trace.read(path)
+
+
+def percentile(values, p):
+    """ Nearest rank percentile of the sorted values """
+    rank = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[rank]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="phase_trace.bin, or a .csv from phase_trace.export()")
+    parser.add_argument("--last", type=int, help="only the most recent cycles")
+    args = parser.parse_args()
+
+    simulator.install()
+    cycles = load(args.path)
+    if args.last:
+        cycles = cycles[-args.last:]
+    if not cycles:
+        print("No cycle in the trace")
+        return 1
+
+    # event -> list of ms per cycle, in order of first appearance
+    durations = {}
+    for cycle, rtc, events in cycles:
+        spent = {}
+        for (event, arg, us), (_, _, next_us) in zip(events, events[1:]):
+            spent[event] = spent.get(event, 0) + (next_us - us) / 1000
+        if events:
+            spent["awake"] = events[-1][2] / 1000
+        for event, ms in spent.items():
+            durations.setdefault(event, []).append(ms)
+
+    print(f"{len(cycles)} cycles, from #{cycles[0][0]} to #{cycles[-1][0]}, times in ms")
+    print(f"{'event':<14}{'cycles':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for event, values in durations.items():
+        values.sort()
+        print(f"{event:<14}{len(values):>7}{percentile(values, 50):>10.1f}{percentile(values, 90):>10.1f}"
+              f"{percentile(values, 99):>10.1f}{values[-1]:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())